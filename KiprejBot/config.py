@@ -13,3 +13,33 @@ ENV_ALLOWED_SUPERUSER_ID = int(os.getenv("ALLOWED_SUPERUSER_ID"))
 UPLOAD_DIR = Path("static/uploads/products")
 UPLOAD_DIR.mkdir(parents=True, exist_ok=True)  # Создание директории, если не существует
 # Это безопасно: mkdir(..., exist_ok=True) не вызовет ошибку, если папка уже есть
+
+# Очистка папки с фото от файлов, на которые нет ссылок в БД:
+# "quarantine" — переносить в static/uploads/quarantine, "delete" — удалять
+UPLOAD_GC_MODE = os.getenv("UPLOAD_GC_MODE", "quarantine")
+
+# Сколько минут товар, добавленный в корзину, держится в резерве на складе
+RESERVATION_TTL_MINUTES = int(os.getenv("RESERVATION_TTL_MINUTES", 15))
+
+# Кэш каталога: время жизни записи (сек.) и максимальное число записей
+CATALOG_CACHE_TTL = int(os.getenv("CATALOG_CACHE_TTL", 300))
+CATALOG_CACHE_MAXSIZE = int(os.getenv("CATALOG_CACHE_MAXSIZE", 512))
+
+# Кэш пользователя (id, роль, корзина) по telegram_id, чтобы проверки ролей
+# не ходили в БД на каждое обновление
+IDENTITY_CACHE_TTL = int(os.getenv("IDENTITY_CACHE_TTL", 600))
+IDENTITY_CACHE_MAXSIZE = int(os.getenv("IDENTITY_CACHE_MAXSIZE", 10000))
+
+# Поиск по каталогу в памяти (битовые индексы), включается CATALOG_ENGINE=1
+CATALOG_ENGINE_ENABLED = os.getenv("CATALOG_ENGINE", "0") == "1"
+
+# Как показывать страницу каталога:
+# "cards" — отдельная карточка с кнопками на каждый товар,
+# "album" — вся страница одним альбомом (sendMediaGroup) и одно сообщение с кнопками,
+# "carousel" — одно сообщение с одним товаром, ⬅️/➡️ меняют товар на месте
+CATALOG_VIEW_MODE = os.getenv("CATALOG_VIEW_MODE", "cards")
+
+# Проверка, что одно обновление держит не больше одного соединения с БД:
+# "warn" — писать предупреждение в лог, "strict" — падать с ошибкой
+# (для тестов и отладки), "off" — не проверять
+DB_CONNECTION_GUARD = os.getenv("DB_CONNECTION_GUARD", "warn")
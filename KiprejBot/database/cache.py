@@ -0,0 +1,86 @@
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+from config import CATALOG_CACHE_TTL, CATALOG_CACHE_MAXSIZE
+
+
+class CatalogCache:
+    """Кэш чтений каталога (категории, размеры, страницы товаров).
+
+    Ключ — кортеж (вид данных, id категории, ...остальные параметры),
+    например ('sizes', 3) или ('products', None, 'M', 0, 0, 10).
+    Исключение — фото товара: ('images', id товара).
+    Запись живёт ttl секунд, при переполнении вытесняется самая давно
+    использованная (LRU). Админские хэндлеры сбрасывают нужные записи
+    сразу после изменения каталога, поэтому ttl — только страховка.
+
+    Закэшированные объекты моделей общие для всех обновлений, их можно
+    только читать, но не изменять.
+    """
+
+    def __init__(self, ttl: float = 300, maxsize: int = 512):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data: OrderedDict[tuple, tuple[float, Any]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: tuple) -> tuple[bool, Any]:
+        """Возвращает (найдено ли значение, значение)."""
+        entry = self._data.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._data[key]  # запись устарела
+            self.misses += 1
+            return False, None
+
+        self._data.move_to_end(key)  # недавно использованная
+        self.hits += 1
+        return True, entry[1]
+
+    def set(self, key: tuple, value: Any) -> None:
+        """Сохраняет значение, вытесняя старые записи при переполнении."""
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def invalidate(self, kind: str, category_id: Optional[Hashable] = ...) -> None:
+        """Удаляет записи вида kind.
+
+        Если передан category_id, удаляются только записи этой категории
+        и записи "все товары" (category_id=None), куда тоже входят её товары.
+        """
+        for key in list(self._data):
+            if key[0] != kind:
+                continue
+            if category_id is ... or key[1] is None or key[1] == category_id:
+                del self._data[key]
+
+    def invalidate_products(self, *category_ids: Optional[int]) -> None:
+        """Сбрасывает страницы товаров, размеры и фасеты для указанных
+        категорий (или для всех категорий, если ни одна не указана)."""
+        for kind in ('products', 'sizes', 'facets'):
+            if not category_ids:
+                self.invalidate(kind)
+            for category_id in category_ids:
+                self.invalidate(kind, category_id)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def stats(self) -> dict:
+        """Счётчики попаданий и промахов для оценки эффекта кэша."""
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total, 3) if total else 0.0,
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'ttl': self.ttl,
+        }
+
+
+# Один кэш на процесс бота
+catalog_cache = CatalogCache(ttl=CATALOG_CACHE_TTL, maxsize=CATALOG_CACHE_MAXSIZE)
@@ -1,12 +1,147 @@
+import asyncio
+import logging
+from dataclasses import dataclass
 from typing import Any, Awaitable, Callable, Dict
 from aiogram import BaseMiddleware
 from aiogram.types import Message, TelegramObject
-from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
+from config import DB_CONNECTION_GUARD
+
+
+class LazySession:
+    """Заместитель AsyncSession, который получает хэндлер в параметре session.
+
+    Настоящая сессия создаётся только при первом обращении к ней
+    (session.execute, session.add, session.scalar и т.д.), а соединение из
+    пула берётся при первом запросе. Обновления, которым БД не нужна
+    (/cancel, noop-кнопки, +/- количества, статичные тексты меню), не создают
+    ни сессии, ни соединения.
+    """
+    __slots__ = ('_session_pool', '_session', 'checkouts')
+
+    def __init__(self, session_pool: async_sessionmaker):
+        self._session_pool = session_pool
+        self._session: AsyncSession | None = None
+        self.checkouts = 0  # сколько раз за обновление бралось соединение из пула
+
+    def _get_session(self) -> AsyncSession:
+        if self._session is None:
+            self._session = self._session_pool()
+            # after_begin срабатывает, когда сессия берёт соединение из пула
+            # (после commit/rollback соединение возвращается в пул)
+            event.listen(self._session.sync_session, 'after_begin', self._on_begin)
+        return self._session
+
+    def _on_begin(self, session, transaction, connection) -> None:
+        self.checkouts += 1
+
+    @property
+    def is_created(self) -> bool:
+        """Обращался ли хэндлер к сессии."""
+        return self._session is not None
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._get_session(), name)
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+
+
+@dataclass
+class SessionUsageStats:
+    """Счётчики использования БД обновлениями с момента запуска бота."""
+    updates: int = 0
+    without_session: int = 0  # хэндлер не обращался к сессии
+    without_db: int = 0       # ни одного соединения из пула
+    checkouts: int = 0
+    max_checkouts: int = 0    # больше всего соединений за одно обновление
+    overlapping: int = 0      # держали несколько соединений одновременно
+
+    def record(self, session: LazySession, peak_connections: int = 0) -> None:
+        self.updates += 1
+        if peak_connections > 1:
+            self.overlapping += 1
+        self.checkouts += session.checkouts
+        self.max_checkouts = max(self.max_checkouts, session.checkouts)
+        if not session.is_created:
+            self.without_session += 1
+        if session.checkouts == 0:
+            self.without_db += 1
+
+    def format(self) -> str:
+        share = self.without_db / self.updates * 100 if self.updates else 0
+        average = self.checkouts / self.updates if self.updates else 0
+        return "\n".join([
+            "🗄 Использование БД обновлениями",
+            f"Обновлений: {self.updates}",
+            f"Без обращения к сессии: {self.without_session}",
+            f"Без соединения с БД: {self.without_db} ({share:.1f}%)",
+            f"Соединений из пула: {self.checkouts} (в среднем {average:.2f} на обновление)",
+            f"Максимум за одно обновление: {self.max_checkouts}",
+            f"Держали несколько соединений одновременно: {self.overlapping}",
+        ])
+
+
+# Общие счётчики для всех экземпляров DataBaseSession (команда /db_stats)
+session_usage = SessionUsageStats()
+
+
+class ConnectionLimitExceeded(RuntimeError):
+    """Обновление взяло из пула второе соединение, не вернув первое."""
+
+
+@dataclass
+class UpdateConnections:
+    """Соединения из пула, которые сейчас держит одно обновление."""
+    active: int = 0
+    peak: int = 0
+
+
+# Обновления в обработке: задача asyncio -> её соединения. aiogram
+# обрабатывает каждое обновление в своей задаче, а пул выдаёт соединение
+# синхронно внутри этой же задачи
+_update_connections: dict[asyncio.Task, UpdateConnections] = {}
+
+
+def install_connection_guard(engine: AsyncEngine) -> None:
+    """Следит через события пула, сколько соединений одновременно держит
+    каждое обновление. Больше одного значит, что кто-то открыл свою сессию
+    (async with async_session()) вместо сессии из middleware.
+    DB_CONNECTION_GUARD="strict" превращает это в ошибку.
+    """
+    if DB_CONNECTION_GUARD == 'off':
+        return
+
+    @event.listens_for(engine.sync_engine, 'checkout')
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        try:
+            task = asyncio.current_task()
+        except RuntimeError:
+            return  # вне цикла событий
+        usage = _update_connections.get(task)
+        if usage is None:
+            return  # не обновление бота (планировщик, скрипты)
+        usage.active += 1
+        usage.peak = max(usage.peak, usage.active)
+        connection_record.info['update_connections'] = usage
+        if usage.active > 1 and DB_CONNECTION_GUARD == 'strict':
+            raise ConnectionLimitExceeded(
+                f'Обновление держит {usage.active} соединения с БД одновременно, '
+                f'используйте сессию из middleware.'
+            )
+
+    @event.listens_for(engine.sync_engine, 'checkin')
+    def on_checkin(dbapi_connection, connection_record):
+        usage = connection_record.info.pop('update_connections', None)
+        if usage is not None:
+            usage.active -= 1
 
 
 class DataBaseSession(BaseMiddleware):
     """Session management layer."""
-    # создаём сессию, как промежуточный слой мд событием и хэндлером
+    # промежуточный слой между событием и хэндлером
     # создаём session_pool куда и передаём sessionmaker
     def __init__(self, session_pool: async_sessionmaker):
         self.session_pool = session_pool  # экземпляр сессии
@@ -17,14 +152,27 @@ class DataBaseSession(BaseMiddleware):
         event: TelegramObject,  # чтобы сессия подходила для любого хэндлера
         data: Dict[str, Any],
     ) -> Any:
-        async with self.session_pool() as session:
-            data['session'] = session  # сессия это и есть подключение к БД
+        session = LazySession(self.session_pool)
+        data['session'] = session  # сессия создаётся при первом обращении хэндлера
+        task = asyncio.current_task()
+        connections = _update_connections[task] = UpdateConnections()
+        try:
             return await handler(event, data)
             # теперь по параметру session (как message, state) будет доступна сессия
             # подключим к основному роутеру, хотя можно и к любому второстепенному роутеру
+        finally:
+            await session.close()
+            _update_connections.pop(task, None)
+            session_usage.record(session, connections.peak)
+            if connections.peak > 1:
+                logging.warning(
+                    "Обновление %s держало %s соединения с БД одновременно",
+                    getattr(event, 'update_id', None), connections.peak
+                )
 
 
-# Подключения к БД через middleware. Автоматически создаёт сессию для
-# каждого обновления и прикрепляет её к словарю data под ключом "session",
-# что позволяет в обработчиках использовать эту сессию (подключение к БД)
-# без явного создания через async with async_session() as session.
+# Подключения к БД через middleware. Для каждого обновления в словарь data
+# под ключом "session" кладётся ленивая сессия, что позволяет в обработчиках
+# использовать эту сессию (подключение к БД) без явного создания через
+# async with async_session() as session. Соединение из пула берётся только
+# если хэндлер действительно выполняет запрос.
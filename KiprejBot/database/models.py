@@ -1,6 +1,8 @@
-from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
+from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship, object_session
+from sqlalchemy.orm.attributes import set_committed_value
 from sqlalchemy import BigInteger, Integer, String, Float, Text, ForeignKey, DateTime, Boolean, func
-from sqlalchemy import Enum
+from sqlalchemy import Enum, Computed, Index, UniqueConstraint, Numeric, cast, event, inspect, select, update
+from sqlalchemy.dialects.postgresql import TSVECTOR
 import enum
 
 
@@ -58,6 +60,21 @@ class Product(Base):
     price: Mapped[float] = mapped_column(Float, nullable=False)
     brand: Mapped[str] = mapped_column(String(100), nullable=True)
     created_at: Mapped[DateTime] = mapped_column(DateTime, default=func.now())
+    updated_at: Mapped[DateTime] = mapped_column(DateTime, default=func.now(), onupdate=func.now())
+    # Номер версии товара, растёт при каждом изменении (см. bump_version ниже).
+    # Входит в ключ кэша готовых карточек товара
+    version: Mapped[int] = mapped_column(Integer, nullable=False, default=1, server_default="1")
+    # Поисковый вектор, PostgreSQL сам пересчитывает его при изменении
+    # названия, бренда или описания (веса A, B, C задают важность полей)
+    search_vector = mapped_column(
+        TSVECTOR,
+        Computed(
+            "setweight(to_tsvector('russian', coalesce(name, '')), 'A') || "
+            "setweight(to_tsvector('russian', coalesce(brand, '')), 'B') || "
+            "setweight(to_tsvector('russian', coalesce(description, '')), 'C')",
+            persisted=True
+        )
+    )
 
     # Категория товара
     category_id: Mapped[int] = mapped_column(Integer, ForeignKey("categories.id"), nullable=True)
@@ -72,6 +89,13 @@ class Product(Base):
     # Cвязь: просмотры товара
     views = relationship("ProductView", back_populates="product", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        # GIN-индекс для полнотекстового поиска по search_vector
+        Index("ix_products_search_vector", "search_vector", postgresql_using="gin"),
+        # Страницы каталога: фильтр по категории + keyset по id
+        Index("ix_products_category_id_id", "category_id", "id"),
+    )
+
 # -----------------------------
 # Изображения товара
 # -----------------------------
@@ -80,6 +104,21 @@ class ProductImage(Base):
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     product_id: Mapped[int] = mapped_column(Integer, ForeignKey("products.id"), nullable=False)
     image_url: Mapped[str] = mapped_column(String(1000), nullable=False)   # Локальный путь к файлу фото
+    # file_id фото на серверах Telegram: по нему фото отправляется без
+    # повторной загрузки файла. Пусто, пока фото ни разу не отправлялось
+    file_id: Mapped[str] = mapped_column(String(255), nullable=True)
+    # file_id миниатюры, которой товар показывается в альбомах каталога
+    thumbnail_file_id: Mapped[str] = mapped_column(String(255), nullable=True)
+    # Производные фото (services/image_pipeline.py), пусто для старых записей
+    card_path: Mapped[str] = mapped_column(String(1000), nullable=True)       # до 1280px, JPEG
+    thumbnail_path: Mapped[str] = mapped_column(String(1000), nullable=True)  # до 320px, JPEG
+    # SHA-256 содержимого (services/image_store.py): записи с одинаковым
+    # хэшем делят одни и те же файлы, число таких записей — счётчик ссылок
+    content_hash: Mapped[str] = mapped_column(String(64), nullable=True, index=True)
+
+    def get_paths(self) -> list[str]:
+        """Все файлы фото на диске: оригинал и производные."""
+        return [path for path in (self.image_url, self.card_path, self.thumbnail_path) if path]
 
     product = relationship("Product", back_populates="images")
 
@@ -95,25 +134,38 @@ class ProductVariant(Base):
     additional_price: Mapped[float] = mapped_column(Float, default=0.0)  # Наценка за вариант (руб.)
     discount_percent: Mapped[float] = mapped_column(Float, default=0.0)  # Скидка для этого варианта (%)
     stock: Mapped[int] = mapped_column(Integer, default=0)  # кол-во для конкретного варианта
+    # Итоговая цена (цена товара + наценка - скидка), хранится в БД, чтобы
+    # сортировать и фильтровать по цене в SQL. Пересчитывается ORM-событиями
+    # ниже при изменении Product.price, additional_price или discount_percent
+    final_price: Mapped[float] = mapped_column(Float, nullable=True)
+    updated_at: Mapped[DateTime] = mapped_column(DateTime, default=func.now(), onupdate=func.now())
+    # Номер версии варианта, растёт при изменении варианта или цены товара.
+    # Остаток на складе версию не меняет: резервы и заказы меняют его
+    # постоянно, а версия означает «цена или описание стали другими»
+    version: Mapped[int] = mapped_column(Integer, nullable=False, default=1, server_default="1")
 
     product = relationship("Product", back_populates="variants")
 
+    __table_args__ = (
+        # orm_get_product_variant_by_size, фильтр по размеру в каталоге
+        Index("ix_product_variants_product_id_size", "product_id", "size"),
+        # Фильтр и сортировка каталога по цене
+        Index("ix_product_variants_product_id_final_price", "product_id", "final_price"),
+    )
+
     def get_final_price(self) -> float:
-        """Рассчитывает конечную цену варианта с учётом наценки и скидки.
+        """Возвращает конечную цену варианта с учётом наценки и скидки.
 
         Возвращает итоговую цену варианта товара:
         - Базовая цена берётся из товара
         - Плюс наценка за размер/цвет (additional_price)
         - Минус скидка (discount_percent)
+        Для сохранённых вариантов цена уже посчитана в final_price,
+        поэтому товар не подгружается.
         """
-        base_price = self.product.price + self.additional_price  # Основная цена + наценка
-
-        if self.discount_percent > 0:
-            final_price = base_price * (1 - self.discount_percent / 100)
-        else:
-            final_price = base_price
-
-        return round(final_price, 2)  # Округляем цену до 2 знаков после запятой
+        if self.final_price is not None:
+            return self.final_price
+        return calculate_final_price(self.product.price, self.additional_price, self.discount_percent)
 
     def old_price(self):
         """Возвращает "старую цену" (базовая цена + наценка за вариант)
@@ -126,6 +178,81 @@ class ProductVariant(Base):
 
 
 
+def calculate_final_price(base_price: float, additional_price: float, discount_percent: float) -> float:
+    """(цена товара + наценка) минус скидка в процентах, с округлением до копеек."""
+    price = (base_price + (additional_price or 0)) * (1 - (discount_percent or 0) / 100)
+    return round(price, 2)  # Округляем цену до 2 знаков после запятой
+
+
+# Колонки, изменение которых не увеличивает version
+VERSION_IGNORED_COLUMNS = {"stock", "updated_at", "version"}
+
+
+@event.listens_for(Product, "before_update")
+@event.listens_for(ProductVariant, "before_update")
+def bump_version(mapper, connection, target):
+    """Увеличивает version товара или варианта при каждом реальном
+    изменении его колонок через ORM (в том числе из админских хэндлеров).
+    Изменение только остатка на складе версию не меняет."""
+    session = object_session(target)
+    if session is None or not session.is_modified(target, include_collections=False):
+        return
+    state = inspect(target)
+    if any(
+        state.attrs[column.key].history.has_changes()
+        for column in mapper.column_attrs
+        if column.key not in VERSION_IGNORED_COLUMNS
+    ):
+        target.version = (target.version or 0) + 1
+
+
+@event.listens_for(ProductVariant, "before_insert")
+@event.listens_for(ProductVariant, "before_update")
+def sync_variant_final_price(mapper, connection, target: ProductVariant):
+    """Пересчитывает final_price варианта при создании и при изменении
+    наценки, скидки или товара."""
+    state = inspect(target)
+    changed = any(
+        state.attrs[name].history.has_changes()
+        for name in ("product_id", "additional_price", "discount_percent")
+    )
+    if target.final_price is not None and not changed:
+        return
+
+    # Берём цену из уже загруженного товара, иначе одним запросом из БД
+    product = target.__dict__.get("product")
+    if product is not None:
+        base_price = product.price
+    else:
+        base_price = connection.scalar(select(Product.price).where(Product.id == target.product_id))
+    target.final_price = calculate_final_price(base_price, target.additional_price, target.discount_percent)
+
+
+@event.listens_for(Product, "after_update")
+def sync_product_variants_final_price(mapper, connection, target: Product):
+    """После изменения цены товара пересчитывает final_price всех его
+    вариантов одним UPDATE и увеличивает их version. Массовые
+    update(Product) в обход ORM это событие не вызывают."""
+    if not inspect(target).attrs.price.history.has_changes():
+        return
+
+    connection.execute(
+        update(ProductVariant)
+        .where(ProductVariant.product_id == target.id)
+        .values(final_price=func.round(cast(
+            (target.price + ProductVariant.additional_price)
+            * (1 - ProductVariant.discount_percent / 100),
+            Numeric
+        ), 2), version=ProductVariant.version + 1)
+    )
+    # Уже загруженные в сессию варианты обновляем без лишнего запроса
+    for variant in target.__dict__.get("variants", []):
+        set_committed_value(variant, "final_price", calculate_final_price(
+            target.price, variant.additional_price, variant.discount_percent
+        ))
+        set_committed_value(variant, "version", (variant.version or 0) + 1)
+
+
 # -----------------------------
 # Корзина и элементы корзины
 # -----------------------------
@@ -151,6 +278,35 @@ class CartItem(Base):
     product = relationship("Product")
     variant = relationship("ProductVariant")  # связать элемент корзины с конкретным вариантом товара
 
+    __table_args__ = (
+        # Одна строка на вариант товара в корзине: orm_add_variant_to_cart
+        # делает INSERT ... ON CONFLICT по этим колонкам (индекс нужен и orm_get_cart_item)
+        UniqueConstraint("cart_id", "product_id", "variant_id",
+                         name="uq_cart_items_cart_id_product_id_variant_id"),
+    )
+
+# -----------------------------
+# Резерв товара на складе
+# -----------------------------
+class StockReservation(Base):
+    """Временное удержание товара: при добавлении в корзину количество
+    сразу списывается с ProductVariant.stock и возвращается на склад,
+    если резерв истёк или товар убрали из корзины (services/reservations.py)."""
+    __tablename__ = "stock_reservations"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    variant_id: Mapped[int] = mapped_column(Integer, ForeignKey("product_variants.id", ondelete="CASCADE"), nullable=False)
+    cart_id: Mapped[int] = mapped_column(Integer, ForeignKey("carts.id", ondelete="CASCADE"), nullable=True)
+    quantity: Mapped[int] = mapped_column(Integer, nullable=False)
+    created_at: Mapped[DateTime] = mapped_column(DateTime, default=func.now())
+    expires_at: Mapped[DateTime] = mapped_column(DateTime, nullable=False)
+
+    __table_args__ = (
+        # Фоновая очистка истёкших резервов
+        Index("ix_stock_reservations_expires_at", "expires_at"),
+        # Снятие резерва при удалении товара из корзины и при оформлении заказа
+        Index("ix_stock_reservations_cart_id_variant_id", "cart_id", "variant_id"),
+    )
+
 # -----------------------------
 # Адрес доставки пользователя
 # -----------------------------
@@ -180,10 +336,20 @@ class Order(Base):
     shipping_status: Mapped[str] = mapped_column(String(50), nullable=True)  # например: "в обработке", "отправлен"
     payment_method: Mapped[str] = mapped_column(String(50), nullable=True)   # например: "Яндекс.Касса", "Карта"
     shipping_address: Mapped[str] = mapped_column(String(255), nullable=True)  # может быть расширен через отдельную таблицу
+    # Ключ повтора оформления: повторный checkout того же пользователя
+    # с тем же ключом вернёт этот заказ
+    idempotency_key: Mapped[str] = mapped_column(String(64), nullable=True)
 
     user = relationship("User", back_populates="orders")
     items = relationship("OrderItem", back_populates="order", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        # orm_get_orders_for_user
+        Index("ix_orders_user_id", "user_id"),
+        # services.cart.checkout: ключ повтора уникален в пределах пользователя
+        UniqueConstraint("user_id", "idempotency_key", name="uq_orders_user_id_idempotency_key"),
+    )
+
 class OrderItem(Base):
     __tablename__ = "order_items"
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
@@ -215,6 +381,11 @@ class Review(Base):
     product = relationship("Product", back_populates="reviews")
     user = relationship("User", back_populates="reviews")
 
+    __table_args__ = (
+        # orm_get_reviews_for_product (только одобренные отзывы)
+        Index("ix_reviews_product_id_is_approved", "product_id", "is_approved"),
+    )
+
 
 # -----------------------------
 # Модель для логирования просмотров товара
@@ -228,3 +399,8 @@ class ProductView(Base):
     view_time: Mapped[DateTime] = mapped_column(DateTime, default=func.now())
 
     product = relationship("Product", back_populates="views")
+
+    __table_args__ = (
+        # Аналитика просмотров товара по времени
+        Index("ix_product_views_product_id_view_time", "product_id", "view_time"),
+    )
@@ -1,12 +1,17 @@
+import asyncio
 from typing import Optional
 import aiofiles, hashlib
 from uuid import uuid4
-from sqlalchemy import select, update, delete
+from sqlalchemy import select, update, delete, exists, func, case, distinct, tuple_, literal
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession
 from database.models import Category, Review, User, Product, ProductImage, Cart, CartItem, Order, Address, ProductVariant
 from pathlib import Path
-from config import UPLOAD_DIR
-from sqlalchemy.orm import selectinload
+from sqlalchemy.orm import selectinload, aliased
+from sqlalchemy.orm.attributes import set_committed_value
+from database.cache import catalog_cache
+from services.image_store import TMP_DIR, store_image, remove_image_files, content_lock, is_recently_stored
+from services.reservations import reserve_stock, release_cart_reservations
 
 # === Работа с пользователями ===
 async def orm_register_user(session: AsyncSession, data: dict) -> None:
@@ -75,16 +80,52 @@ def apply_category_filter(query, category_id: Optional[int]):
 
 # Фильтрация по размеру (наличие нужного варианта)
 def apply_size_filter(query, size: Optional[str]):
-    """Применить к запросу фильтр по размеру товара."""
+    """Применить к запросу фильтр по размеру товара: есть вариант этого
+    размера в наличии (то же условие, что в счётчиках orm_get_facet_counts)."""
     if size:
         query = query.where(
             exists().where(
                 (ProductVariant.product_id == Product.id) &
-                (ProductVariant.size == size)
+                (ProductVariant.size == size) &
+                (ProductVariant.stock > 0)
             )
         )
     return query
 
+
+# Фильтрация по цене (есть вариант с итоговой ценой в диапазоне)
+def apply_price_filter(query, price_from: Optional[float] = None, price_to: Optional[float] = None):
+    """Применить к запросу фильтр по итоговой цене варианта в наличии:
+    price_from <= final_price < price_to, пустые границы не применяются.
+    Условие на наличие то же, что в ценовых счётчиках orm_get_facet_counts."""
+    if price_from is None and price_to is None:
+        return query
+    condition = (ProductVariant.product_id == Product.id) & (ProductVariant.stock > 0)
+    if price_from is not None:
+        condition &= ProductVariant.final_price >= price_from
+    if price_to is not None:
+        condition &= ProductVariant.final_price < price_to
+    return query.where(exists().where(condition))
+
+
+# Только товары с фото (режим карусели показывает товар фотографией)
+def apply_images_filter(query, with_images: bool):
+    """Применить к запросу фильтр "у товара есть хотя бы одно фото"."""
+    if with_images:
+        query = query.where(exists().where(ProductImage.product_id == Product.id))
+    return query
+
+
+def get_min_price(product=Product):
+    """SQL-выражение "цена от": минимальная итоговая цена вариантов товара,
+    для товара без вариантов — его базовая цена."""
+    min_variant_price = (
+        select(func.min(ProductVariant.final_price))
+        .where(ProductVariant.product_id == product.id)
+        .scalar_subquery()
+    )
+    return func.coalesce(min_variant_price, product.price)
+
 async def orm_get_category_by_name(session: AsyncSession, category_name: str):
     """Возвращает категорию по её названию."""
     query = select(Category).where(Category.name == category_name)
@@ -92,23 +133,212 @@ async def orm_get_category_by_name(session: AsyncSession, category_name: str):
     return result.scalar()
 
 async def orm_get_all_categories(session: AsyncSession) -> list[Category]:
-    """Возвращает список всех категорий товаров."""
+    """Возвращает список всех категорий товаров (через кэш каталога)."""
+    key = ('categories',)
+    found, categories = catalog_cache.get(key)
+    if found:
+        return categories
+
     query = select(Category).order_by(Category.name)
     result = await session.execute(query)
-    return result.scalars().all()
+    categories = result.scalars().all()
+    catalog_cache.set(key, categories)
+    return categories
 
 async def orm_get_filtered_products(
     session: AsyncSession,
     category_id: Optional[int] = None,
-    size: Optional[str] = None
-) -> list[Product]:
-    """Список товаров, отфильтрованных по категории и размеру."""
+    size: Optional[str] = None,
+    after_id: int = 0,
+    before_id: int = 0,
+    page_size: int = 10,
+    price_from: Optional[float] = None,
+    price_to: Optional[float] = None,
+    sort_by_price: bool = False,
+    with_images: bool = False
+) -> tuple[list[Product], bool]:
+    """Одна страница товаров, отфильтрованных по категории, размеру и цене.
+
+    Keyset-пагинация: вместо OFFSET берём page_size товаров, у которых id
+    больше after_id (листаем вперёд) или меньше before_id (листаем назад).
+    Стоимость запроса не зависит от номера страницы. Изображения и варианты
+    подгружаются только для товаров этой страницы.
+
+    При sort_by_price товары упорядочены по паре ("цена от", id), а курсор
+    остаётся тем же id товара: его цена берётся подзапросом в БД.
+    with_images: пропускать товары без фото.
+    return: (товары страницы в порядке сортировки, есть ли ещё товары дальше
+             в направлении листания)
+    """
     query = get_base_product_query()
     query = apply_category_filter(query, category_id)
     query = apply_size_filter(query, size)
+    query = apply_price_filter(query, price_from, price_to)
+    query = apply_images_filter(query, with_images)
+
+    if sort_by_price:
+        price = get_min_price()
+        cursor = aliased(Product)
+        cursor_id = before_id or after_id
+        cursor_price = (
+            select(get_min_price(cursor)).where(cursor.id == cursor_id).scalar_subquery()
+        )
+        query = query.order_by(None)
+        if before_id:
+            query = query.where(tuple_(price, Product.id) < tuple_(cursor_price, before_id))
+            query = query.order_by(price.desc(), Product.id.desc())
+        else:
+            if after_id:
+                query = query.where(tuple_(price, Product.id) > tuple_(cursor_price, after_id))
+            query = query.order_by(price, Product.id)
+    elif before_id:
+        query = query.where(Product.id < before_id).order_by(None).order_by(Product.id.desc())
+    else:
+        query = query.where(Product.id > after_id)
+
+    # Берём на один товар больше, чтобы узнать, есть ли следующая страница
+    query = query.limit(page_size + 1)
 
     result = await session.execute(query)
-    return result.scalars().all()
+    products = list(result.scalars().all())
+    has_more = len(products) > page_size
+    products = products[:page_size]
+
+    # Проставляем вариантам ссылку на товар без ленивой загрузки, чтобы
+    # get_final_price() работал и вне сессии (например, из кэша)
+    for product in products:
+        for variant in product.variants:
+            set_committed_value(variant, 'product', product)
+
+    if before_id:
+        products.reverse()
+    return products, has_more
+
+def get_products_cache_key(
+    category_id: Optional[int],
+    size: Optional[str],
+    after_id: int,
+    before_id: int,
+    page_size: int,
+    price_from: Optional[float] = None,
+    price_to: Optional[float] = None,
+    sort_by_price: bool = False
+) -> tuple:
+    """Ключ кэша каталога для страницы товаров."""
+    return ('products', category_id, size or '', after_id, before_id, page_size,
+            price_from, price_to, sort_by_price)
+
+async def orm_get_filtered_products_cached(
+    session: AsyncSession,
+    category_id: Optional[int] = None,
+    size: Optional[str] = None,
+    after_id: int = 0,
+    before_id: int = 0,
+    page_size: int = 10,
+    price_from: Optional[float] = None,
+    price_to: Optional[float] = None,
+    sort_by_price: bool = False
+) -> tuple[list[Product], bool]:
+    """То же, что orm_get_filtered_products, но через кэш каталога."""
+    key = get_products_cache_key(category_id, size, after_id, before_id, page_size,
+                                 price_from, price_to, sort_by_price)
+    found, page = catalog_cache.get(key)
+    if found:
+        return page
+
+    page = await orm_get_filtered_products(
+        session, category_id, size, after_id, before_id, page_size,
+        price_from, price_to, sort_by_price
+    )
+    catalog_cache.set(key, page)
+    return page
+
+async def orm_get_carousel_product(
+    session: AsyncSession,
+    category_id: Optional[int] = None,
+    size: Optional[str] = None,
+    after_id: int = 0,
+    before_id: int = 0,
+    price_from: Optional[float] = None,
+    price_to: Optional[float] = None,
+    sort_by_price: bool = False,
+    prefetch: int = 2
+) -> tuple[Optional[Product], bool, bool]:
+    """Один товар для режима карусели: следующий после after_id или
+    предыдущий перед before_id (в порядке каталога). Товары без фото
+    пропускаются: карусель показывает товар фотографией.
+
+    При промахе кэша из БД одним запросом берётся сам товар и ещё prefetch
+    соседей в направлении листания. Соседи сразу кладутся в кэш под теми
+    ключами, с которыми придут следующие нажатия ⬅️/➡️, поэтому обычное
+    листание почти не ходит в БД.
+    return: (товар или None, есть ли товар до него, есть ли товар после)
+    """
+    def key(after: int, before: int) -> tuple:
+        # отдельно от обычных страниц из одного товара: здесь только товары с фото
+        return get_products_cache_key(category_id, size, after, before, 1,
+                                      price_from, price_to, sort_by_price) + ('carousel',)
+
+    found, entry = catalog_cache.get(key(after_id, before_id))
+    if not found:
+        window, has_more = await orm_get_filtered_products(
+            session, category_id, size, after_id, before_id, 1 + prefetch,
+            price_from, price_to, sort_by_price, with_images=True
+        )
+        if not window:
+            return None, False, False
+
+        # window упорядочен по каталогу; "снаружи" окна товары есть:
+        # со стороны курсора — если курсор задан, с другой — если has_more
+        if before_id:
+            outer_before, outer_after = has_more, True
+        else:
+            outer_before, outer_after = after_id > 0, has_more
+        entries = [
+            (product, i > 0 or outer_before, i < len(window) - 1 or outer_after)
+            for i, product in enumerate(window)
+        ]
+        for i, window_entry in enumerate(entries):
+            if i > 0:
+                catalog_cache.set(key(window[i - 1].id, 0), window_entry)
+            if i < len(window) - 1:
+                catalog_cache.set(key(0, window[i + 1].id), window_entry)
+        entry = entries[-1] if before_id else entries[0]
+        catalog_cache.set(key(after_id, before_id), entry)
+
+    return entry
+
+async def orm_search_products(
+    session: AsyncSession,
+    text: str,
+    page: int = 1,
+    page_size: int = 10
+) -> tuple[list[Product], bool]:
+    """Полнотекстовый поиск товаров по названию, бренду и описанию.
+
+    Запрос разбирается websearch_to_tsquery с русским стеммингом ("куртки"
+    найдёт "куртка"), поиск идёт по GIN-индексу на Product.search_vector.
+    Сортировка по релевантности (ts_rank) и пагинация выполняются в БД.
+    return: (товары страницы, есть ли следующая страница)
+    """
+    ts_query = func.websearch_to_tsquery('russian', text)
+    rank = func.ts_rank(Product.search_vector, ts_query)
+
+    query = (
+        get_base_product_query()
+        .where(Product.search_vector.op('@@')(ts_query))
+        .order_by(None)
+        .order_by(rank.desc(), Product.id)
+        .limit(page_size + 1)
+        .offset((page - 1) * page_size)
+    )
+    result = await session.execute(query)
+    products = list(result.scalars().all())
+
+    for product in products:
+        for variant in product.variants:
+            set_committed_value(variant, 'product', product)
+    return products[:page_size], len(products) > page_size
 
 # === Работа с товарами и с вариантами ===
 async def orm_add_product(session: AsyncSession, data: dict) -> Product:
@@ -163,6 +393,7 @@ async def orm_delete_product_images(session, product_id):
     query = delete(ProductImage).where(ProductImage.product_id == product_id)
     await session.execute(query)
     await session.commit()
+    catalog_cache.invalidate('images', product_id)
 
 async def orm_delete_product_variants(session, product_id):
     """Удаляет связанные с товаром варианты, принимает id товара."""
@@ -172,12 +403,20 @@ async def orm_delete_product_variants(session, product_id):
 
 async def orm_delete_product(session, product_id):
     """Удаляет товар, принимает id товара."""
-    query = delete(Product).where(Product.id == product_id)
-    await session.execute(query)
+    query = delete(Product).where(Product.id == product_id).returning(Product.category_id)
+    result = await session.execute(query)
+    category_id = result.scalar()
     await session.commit()
+    catalog_cache.invalidate_products(category_id)
 
 async def orm_get_available_sizes(session: AsyncSession, category_id: int) -> list[str]:
-    """Получает список доступных размеров одежды в выбраной категории товаров."""
+    """Получает список доступных размеров одежды в выбраной категории товаров
+    (через кэш каталога)."""
+    key = ('sizes', category_id)
+    found, sizes = catalog_cache.get(key)
+    if found:
+        return sizes
+
     query = (
         select(ProductVariant.size)
         .distinct()
@@ -188,7 +427,106 @@ async def orm_get_available_sizes(session: AsyncSession, category_id: int) -> li
         query = query.where(Product.category_id == category_id)
 
     result = await session.execute(query)
-    return [row[0] for row in result.all() if row[0]]
+    sizes = [row[0] for row in result.all() if row[0]]
+    catalog_cache.set(key, sizes)
+    return sizes
+
+# Границы ценовых диапазонов для фасетов каталога (руб.)
+PRICE_BUCKETS = (1000, 3000, 5000, 10000)
+
+
+def get_price_bucket_label(bucket: int) -> str:
+    """Подпись ценового диапазона по его номеру: 'до 1000', '1000–3000', 'от 10000'."""
+    if bucket == 0:
+        return f'до {PRICE_BUCKETS[0]}'
+    if bucket == len(PRICE_BUCKETS):
+        return f'от {PRICE_BUCKETS[-1]}'
+    return f'{PRICE_BUCKETS[bucket - 1]}–{PRICE_BUCKETS[bucket]}'
+
+
+def get_price_bucket_range(bucket: int) -> tuple[Optional[float], Optional[float]]:
+    """Границы ценового диапазона по его номеру для apply_price_filter.
+    Отрицательный номер — любая цена: (None, None)."""
+    if bucket < 0:
+        return None, None
+    price_from = PRICE_BUCKETS[bucket - 1] if bucket > 0 else None
+    price_to = PRICE_BUCKETS[bucket] if bucket < len(PRICE_BUCKETS) else None
+    return price_from, price_to
+
+
+async def orm_get_facet_counts(session: AsyncSession, category_id: Optional[int]) -> dict:
+    """Количество товаров в наличии по размерам, цветам, брендам и ценовым
+    диапазонам в категории — одним запросом с GROUPING SETS (через кэш каталога).
+
+    return: {
+        'sizes': {'M': 14, ...},
+        'colors': {'Чёрный': 3, ...},
+        'brands': {'Kiprej': 20, ...},
+        'prices': {0: 5, 2: 7, ...}  # номер диапазона из PRICE_BUCKETS
+    }
+    """
+    key = ('facets', category_id)
+    found, facets = catalog_cache.get(key)
+    if found:
+        return facets
+
+    # Итоговая цена варианта хранится в ProductVariant.final_price
+    price_bucket = case(
+        *[(ProductVariant.final_price < edge, number) for number, edge in enumerate(PRICE_BUCKETS)],
+        else_=len(PRICE_BUCKETS)
+    )
+    # Сначала строки "вариант в наличии" с вычисленным диапазоном цены
+    variants = (
+        select(
+            Product.id.label('product_id'),
+            ProductVariant.size,
+            ProductVariant.color,
+            Product.brand,
+            price_bucket.label('price_bucket')
+        )
+        .join(Product)
+        .where(ProductVariant.stock > 0)
+    )
+    variants = apply_category_filter(variants, category_id).subquery()
+
+    # Затем один GROUP BY сразу по четырём наборам группировки,
+    # grouping() = 0 показывает, к какому набору относится строка
+    query = (
+        select(
+            variants.c.size,
+            variants.c.color,
+            variants.c.brand,
+            variants.c.price_bucket,
+            func.grouping(variants.c.size).label('by_size'),
+            func.grouping(variants.c.color).label('by_color'),
+            func.grouping(variants.c.brand).label('by_brand'),
+            func.count(distinct(variants.c.product_id)).label('products')
+        )
+        .group_by(func.grouping_sets(
+            variants.c.size,
+            variants.c.color,
+            variants.c.brand,
+            variants.c.price_bucket
+        ))
+    )
+    result = await session.execute(query)
+
+    facets = {'sizes': {}, 'colors': {}, 'brands': {}, 'prices': {}}
+    for row in result.all():
+        if row.by_size == 0:
+            if row.size:
+                facets['sizes'][row.size] = row.products
+        elif row.by_color == 0:
+            if row.color:
+                facets['colors'][row.color] = row.products
+        elif row.by_brand == 0:
+            if row.brand:
+                facets['brands'][row.brand] = row.products
+        else:
+            facets['prices'][row.price_bucket] = row.products
+
+    catalog_cache.set(key, facets)
+    return facets
 
 async def orm_get_available_sizes_for_product(product_id: int, session: AsyncSession):
     """Получает список всех доступныч размеров для конкретного
@@ -199,6 +537,17 @@ async def orm_get_available_sizes_for_product(product_id: int, session: AsyncSes
     sizes = [row[0] for row in result.all() if row[0]]
     return sizes
 
+async def orm_get_variant_options(product_id: int, session: AsyncSession):
+    """Варианты товара для кнопок выбора размера: (id, size, color, version),
+    без загрузки самого товара."""
+    query = (
+        select(ProductVariant.id, ProductVariant.size, ProductVariant.color, ProductVariant.version)
+        .where(ProductVariant.product_id == product_id, ProductVariant.size != '')
+        .order_by(ProductVariant.id)
+    )
+    result = await session.execute(query)
+    return result.all()
+
 async def orm_get_product_with_images(product_id: int, session: AsyncSession):
     """Получает товар со всеми изображениями (списком адресов изображений).
     product_id: int - id товара
@@ -212,6 +561,21 @@ async def orm_get_product_with_images(product_id: int, session: AsyncSession):
         return None, []
     return product, product.images
 
+async def orm_get_product_with_images_cached(product_id: int, session: AsyncSession):
+    """То же, что orm_get_product_with_images, но через кэш каталога:
+    листание фото в карточке не ходит в БД. Запись сбрасывается при
+    изменении товара или его фото (ключ ('images', product_id)).
+    """
+    key = ('images', product_id)
+    found, entry = catalog_cache.get(key)
+    if found:
+        return entry
+
+    entry = await orm_get_product_with_images(product_id, session)
+    if entry[0] is not None:
+        catalog_cache.set(key, entry)
+    return entry
+
 async def orm_get_product_variant_by_size(
         session: AsyncSession, product_id: int, size: str
 ) -> Optional[ProductVariant]:
@@ -232,6 +596,42 @@ async def orm_get_product_variant_by_size(
 
 # === Работа с изображениями товаров ===
 
+async def download_product_image(file, product_id: int, bot) -> ProductImage:
+    """Скачивает фото товара с серверов Telegram, кладёт его в хранилище
+    по хэшу содержимого (с производными) и возвращает ещё не сохранённую
+    в БД запись ProductImage.
+
+    file: объект файла, полученный через bot.get_file();
+    Ошибки скачивания пробрасываются вызывающему коду.
+    """
+    TMP_DIR.mkdir(parents=True, exist_ok=True)  # Создаём папку, если её нет
+
+    # Получаем расширение файла
+    file_ext = file.file_path.split(".")[-1]  # jpg, png и т.д.
+    tmp_path = TMP_DIR / f"{product_id}_{uuid4().hex}.{file_ext}"
+
+    # Скачиваем файл с серверов Telegram
+    try:
+        await bot.download_file(file.file_path, destination=tmp_path)
+    except Exception:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+    # Одинаковое фото хранится на диске один раз
+    content_hash, derivatives = await store_image(tmp_path, file_ext)
+
+    # Сохраняем file_id: фото уже лежит в Telegram, и покупателям его
+    # можно отправлять без повторной загрузки
+    return ProductImage(
+        product_id=product_id,
+        image_url=derivatives['original'],
+        file_id=file.file_id,
+        card_path=derivatives.get('card'),
+        thumbnail_path=derivatives.get('thumbnail'),
+        content_hash=content_hash
+    )
+
+
 async def orm_save_product_image(file, product_id: int, db: AsyncSession, bot=None) -> str:
     """Асинхронно сохраняет изображение в файловой системе и записывает путь в БД
 
@@ -244,34 +644,113 @@ async def orm_save_product_image(file, product_id: int, db: AsyncSession, bot=No
     if bot is None:
         raise ValueError("Bot instance must be provided for saving the image.")
 
-    UPLOAD_DIR.mkdir(parents=True, exist_ok=True)  # Создаём папку, если её нет
-
-    # Получаем расширение файла
-    file_ext = file.file_path.split(".")[-1]  # jpg, png и т.д.
-    filename = f"{product_id}_{uuid4().hex}.{file_ext}"  # например '42_3fa85f6457174562b3fc2c963f66afa6.jpg'
-    file_path = UPLOAD_DIR / filename
-
     try:
-        # Скачиваем файл с серверов Telegram
-        await bot.download_file(file.file_path, destination=file_path)
+        new_image = await download_product_image(file, product_id, bot)
 
         # Сохраняем запись в БД
-        new_image = ProductImage(product_id=product_id, image_url=str(file_path))
         db.add(new_image)
         await db.commit()
+        catalog_cache.invalidate('images', product_id)
 
-        return str(file_path)
+        return new_image.image_url
 
     except Exception as e:
         print(f"Ошибка сохранения файла: {e}")
         return None
 
+
+async def orm_remove_unused_image_files(
+    session: AsyncSession,
+    images: list[tuple[Optional[str], list[str]]]
+) -> int:
+    """Удаляет с диска файлы фото, на которые больше не ссылается ни одна
+    запись ProductImage. Вызывать после удаления записей из БД.
+
+    Файлы, недавно выданные store_image, остаются ночной очистке: их
+    может ждать ещё не сохранённая запись ProductImage.
+    images: [(content_hash, пути файлов), ...] удалённых записей. Файлы
+            старых записей без хэша ни с кем не делятся и удаляются сразу.
+    return: сколько фото удалено с диска
+    """
+    removed = 0
+    for content_hash in {content_hash for content_hash, _ in images if content_hash}:
+        paths = next(paths for image_hash, paths in images if image_hash == content_hash)
+        # Под той же блокировкой, что и store_image: одновременная загрузка
+        # такого же фото не получит файлы, которые мы сейчас удаляем
+        async with content_lock(content_hash):
+            if await session.scalar(select(exists().where(ProductImage.content_hash == content_hash))):
+                continue  # файл ещё нужен другим товарам
+            if is_recently_stored(paths):
+                continue  # только что выдан новой, ещё не сохранённой записи
+            remove_image_files(paths)
+        removed += 1
+    for content_hash, paths in images:
+        if not content_hash:
+            remove_image_files(paths)
+            removed += 1
+    return removed
+
+
+async def orm_add_product_images(
+    session: AsyncSession,
+    bot,
+    product_id: int,
+    file_ids: list[str],
+    max_concurrency: int = 5
+) -> list[tuple[int, str]]:
+    """Скачивает фото товара параллельно (не больше max_concurrency
+    одновременно) и добавляет записи ProductImage в сессию без commit,
+    чтобы все фото сохранились одной транзакцией вместе с остальными данными.
+
+    Порядок фото сохраняется. Ошибка одного фото не мешает остальным.
+    return: список неудачных фото [(номер фото с 1, текст ошибки), ...]
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def ingest(file_id: str) -> ProductImage:
+        async with semaphore:
+            file = await bot.get_file(file_id)
+            return await download_product_image(file, product_id, bot)
+
+    results = await asyncio.gather(*(ingest(file_id) for file_id in file_ids), return_exceptions=True)
+
+    failures = []
+    for number, result in enumerate(results, start=1):
+        if isinstance(result, Exception):
+            failures.append((number, str(result) or type(result).__name__))
+        else:
+            session.add(result)
+    return failures
+
     # Улучшила функцию: save_product_image(file_id, ..., bot) — теперь она сама умеет:
     # получить файл по file_id;
     # узнать путь на серверах Telegram;
     # и сама скачать файл по file_path
 
 
+async def orm_set_image_file_ids(
+    session: AsyncSession,
+    file_ids: dict[int, str],
+    thumbnail: bool = False
+) -> None:
+    """Запоминает file_id, полученные от Telegram после отправки фото с диска
+    (thumbnail=True — после отправки миниатюр в альбоме).
+
+    Все фото одного ответа записываются одним UPDATE и одним commit.
+    file_ids: {id фото: file_id}
+    """
+    if not file_ids:
+        return
+    column = 'thumbnail_file_id' if thumbnail else 'file_id'
+    await session.execute(
+        update(ProductImage)
+        .where(ProductImage.id.in_(file_ids))
+        .values({column: case(file_ids, value=ProductImage.id)})
+        .execution_options(synchronize_session=False)  # объекты обновляет вызывающий
+    )
+    await session.commit()
+
+
 # === Работа с категориями ===
 async def orm_category_has_products(session: AsyncSession, category_id: int) -> bool:
     """Проверяет, есть ли у категории привязанные товары."""
@@ -295,6 +774,7 @@ async def orm_add_category(session: AsyncSession, name: str, description: str =
     category = Category(name=name, description=description)
     session.add(category)
     await session.commit()
+    catalog_cache.invalidate('categories')
     return category
 
 
@@ -306,6 +786,7 @@ async def orm_update_category(session: AsyncSession, category_id: int, name: str
     )
     await session.execute(stmt)
     await session.commit()
+    catalog_cache.invalidate('categories')
 
 
 async def orm_delete_category(session: AsyncSession, category_id: int):
@@ -322,6 +803,7 @@ async def orm_delete_category(session: AsyncSession, category_id: int):
 
     await session.delete(category)
     await session.commit()
+    catalog_cache.invalidate('categories')
     return True
 
 # === Работа с корзиной ===
@@ -373,12 +855,16 @@ async def orm_get_cart_item(
         CartItem.product_id == product_id,
         CartItem.variant_id == variant_id
     )
-    result = session.execute(query)
+    result = await session.execute(query)
     return result.scalar()
 
 async def orm_remove_item_from_cart(session: AsyncSession, cart_item_id: int) -> None:
-    stmt = delete(CartItem).where(CartItem.id == cart_item_id)
-    await session.execute(stmt)
+    """Убирает позицию из корзины и возвращает её резерв на склад.
+    После неё вызывающий сбрасывает кэши через on_stock_changed."""
+    stmt = delete(CartItem).where(CartItem.id == cart_item_id).returning(CartItem.cart_id, CartItem.variant_id)
+    removed = (await session.execute(stmt)).first()
+    if removed and removed.variant_id is not None:
+        await release_cart_reservations(session, removed.cart_id, removed.variant_id)
     await session.commit()
 
 async def orm_add_product_to_cart(
@@ -387,52 +873,99 @@ async def orm_add_product_to_cart(
     size: str,
     quantity: int,
     session: AsyncSession
-) -> None:
+):
     """
     Добавляет товар с выбранным размером в корзину пользователя.
 
-    1. Получает пользователя по telegram_id (user_id).
-    2. Получает или создаёт корзину для этого пользователя.
-    3. Получает товар и вариант (по размеру) для выбранного товара.
-    4. Если элемент уже есть в корзине – увеличивает количество,
-       иначе – создаёт новый элемент корзины с ценой на момент добавления.
+    Нужен для кнопок без variant_id (из старых сообщений): находит вариант
+    по размеру и добавляет его через orm_add_variant_to_cart.
+    return: то же, что orm_add_variant_to_cart.
     """
-    # 1. Получаем пользователя
-    user = await orm_get_user_by_telegram(session, user_id)
-    if not user:
-        raise ValueError(f'Пользователь с telegram_id {user_id} не найден.')
-
-     # 2. Получаем или создаём корзину для пользователя
-    cart = await orm_get_or_create_cart(session, user)
-
-    # 3. Получаем товар по id
-    product = await orm_get_product_by_id(session, product_id)
-    if not product:
-        raise ValueError(f'Товар с id {product_id} не найден.')
+    variant_id = await session.scalar(
+        select(ProductVariant.id)
+        .where(ProductVariant.product_id == product_id, ProductVariant.size == size)
+        .order_by(ProductVariant.id)
+        .limit(1)
+    )
+    if not variant_id:
+        raise ValueError(f'Вариант товара с размером {size} для товара {product_id} не найден.')
+    return await orm_add_variant_to_cart(session, user_id, variant_id, quantity)
 
-    # 4. Получаем вариант товара с нужным размером
-    variant = await orm_get_product_variant_by_size(session, product.id, size)
-    if not variant:
-        raise ValueError(f'Вариант товара с размером {size} для товара {product.name} не найден.')
 
-    # 5.Рассчитываем цену на момент добавления
-    price_at_time = variant.get_final_price()
+async def orm_add_variant_to_cart(
+    session: AsyncSession,
+    user_id: int,
+    variant_id: int,
+    quantity: int
+):
+    """Добавляет вариант товара в корзину пользователя одним запросом.
+
+    WITH cart AS (INSERT INTO carts ... ON CONFLICT (user_id) DO UPDATE ... RETURNING id)
+    INSERT INTO cart_items ... SELECT ... FROM cart, product_variants
+    ON CONFLICT (cart_id, product_id, variant_id)
+    DO UPDATE SET quantity = cart_items.quantity + EXCLUDED.quantity
+
+    Корзина находится (или создаётся) по telegram_id пользователя, вариант —
+    по первичному ключу, цена на момент добавления берётся из final_price.
+    Уникальное ограничение на (cart_id, product_id, variant_id) не даёт
+    двум быстрым нажатиям создать две строки: второе просто прибавит количество.
+    В той же транзакции добавленное количество резервируется на складе,
+    если товара не хватает — OutOfStockError и корзина не меняется.
+    После успешного добавления вызывающий сбрасывает кэши через on_stock_changed.
+    user_id: telegram_id пользователя.
+    return: строка (id, cart_id, quantity, final_price, version) — позиция
+            корзины, текущие цена и версия варианта.
+    """
+    user_ids = select(User.id).where(User.telegram_id == user_id)
+    cart_insert = pg_insert(Cart).from_select(['user_id'], user_ids)
+    cart = cart_insert.on_conflict_do_update(
+        index_elements=[Cart.user_id],
+        set_={'user_id': cart_insert.excluded.user_id}  # пустое обновление, чтобы RETURNING вернул id
+    ).returning(Cart.id).cte('cart')
+
+    item_insert = pg_insert(CartItem).from_select(
+        ['cart_id', 'product_id', 'variant_id', 'quantity', 'price_at_time'],
+        select(
+            cart.c.id,
+            ProductVariant.product_id,
+            ProductVariant.id,
+            literal(quantity),
+            ProductVariant.final_price
+        ).where(ProductVariant.id == variant_id)
+    )
+    def variant_column(column):
+        # RETURNING видит только cart_items, поля варианта — подзапросом
+        # по id варианта (без cart_items во FROM, иначе подзапрос вернёт
+        # по строке на каждую позицию всех корзин)
+        return select(column).where(ProductVariant.id == variant_id).scalar_subquery()
 
-    # 6. Проверяем, есть ли уже элемент корзины с этим товаром и вариантом,
-    # если есть, увеличиваем колличество на quantity, если нет создаём новый CartItem
-    cart_item = await orm_get_cart_item(session, cart.id, product.id, variant.id)
-    if cart_item:
-        cart_item.quantity += quantity
-    else:
-        new_item = CartItem(
-            cart_id=cart.id,
-            product_id=product.id,
-            variant_id=variant.id,
-            quantity=quantity,
-            price_at_time=price_at_time
+    query = (
+        item_insert.on_conflict_do_update(
+            index_elements=[CartItem.cart_id, CartItem.product_id, CartItem.variant_id],
+            set_={'quantity': CartItem.quantity + item_insert.excluded.quantity}
+        )
+        .returning(
+            CartItem.id,
+            CartItem.cart_id,
+            CartItem.quantity,
+            variant_column(ProductVariant.final_price).label('final_price'),
+            variant_column(ProductVariant.version).label('version')
         )
-        session.add(new_item)
+        .add_cte(cart)
+    )
+    result = await session.execute(query)
+    added = result.first()
+    if added is None:
+        await session.rollback()
+        raise ValueError(f'Пользователь {user_id} или вариант товара {variant_id} не найден.')
+
+    try:
+        await reserve_stock(session, variant_id, quantity, cart_id=added.cart_id)
+    except ValueError:
+        await session.rollback()
+        raise
     await session.commit()
+    return added
 
 
 # === Работа с заказами ===
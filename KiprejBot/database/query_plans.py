@@ -0,0 +1,160 @@
+"""Проверка планов частых запросов из orm_requests.py.
+
+Запуск из папки KiprejBot на заполненной (seeded) базе:
+
+    python -m database.query_plans
+
+Запросы берутся у самих функций orm_requests.py (перехватываются до
+отправки в БД), для каждого выполняется EXPLAIN, и выводятся запросы, в плане
+которых остался Seq Scan. На маленьких таблицах PostgreSQL честно
+предпочитает полный просмотр индексу, поэтому проверять имеет смысл на
+данных, близких по объёму к боевым (после ANALYZE).
+"""
+import asyncio
+import json
+from typing import Awaitable, Callable
+from sqlalchemy import event, select, func, text, String
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.dialects.postgresql import REGCONFIG
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import ORMExecuteState
+from sqlalchemy.sql import Executable
+from analytics.analytics import get_popular_products
+from database.models import User, Product, ProductVariant, CartItem
+from database.orm_requests import (orm_get_user_by_telegram, orm_get_filtered_products,
+                                   orm_get_product_variant_by_size, orm_get_or_create_cart,
+                                   orm_get_cart_item, orm_get_reviews_for_product,
+                                   orm_get_orders_for_user, orm_search_products)
+
+
+async def get_sample_values(session: AsyncSession) -> dict:
+    """Берёт реальные значения из БД, чтобы планы строились по настоящим данным."""
+    variant = (await session.execute(
+        select(ProductVariant.product_id, ProductVariant.size).limit(1)
+    )).first()
+    cart_item = (await session.execute(
+        select(CartItem.cart_id, CartItem.product_id, CartItem.variant_id).limit(1)
+    )).first()
+    return {
+        'telegram_id': await session.scalar(select(func.min(User.telegram_id))) or 0,
+        'user_id': await session.scalar(select(func.min(User.id))) or 0,
+        'category_id': await session.scalar(select(func.min(Product.category_id))) or 0,
+        'product_id': variant.product_id if variant else 0,
+        'size': variant.size if variant else 'M',
+        'cart_id': cart_item.cart_id if cart_item else 0,
+        'variant_id': cart_item.variant_id if cart_item else 0,
+    }
+
+
+class PlanCompiler(postgresql.dialect.statement_compiler):
+    """Подставляет значения параметров прямо в SQL для EXPLAIN. Умеет и
+    REGCONFIG (конфигурация поиска 'russian' в orm_search_products), для
+    которого у SQLAlchemy нет готовой подстановки."""
+
+    def render_literal_value(self, value, type_):
+        if isinstance(type_, REGCONFIG):
+            return f'{super().render_literal_value(value, String())}::regconfig'
+        return super().render_literal_value(value, type_)
+
+
+class PlanDialect(postgresql.dialect):
+    statement_compiler = PlanCompiler
+
+
+class _Captured(Exception):
+    """Прерывает запрос, как только функция из orm_requests его построила."""
+
+    def __init__(self, statement: Executable):
+        super().__init__()
+        self.statement = statement
+
+
+async def capture_statement(session: AsyncSession, call: Callable[[], Awaitable]) -> Executable:
+    """Вызывает функцию из orm_requests и возвращает select(), который
+    она передала в сессию первым. Сам запрос в БД не уходит, поэтому и
+    функции с записью (orm_get_or_create_cart) ничего не меняют.
+    """
+    def intercept(state: ORMExecuteState) -> None:
+        if not state.is_relationship_load:
+            raise _Captured(state.statement)
+
+    event.listen(session.sync_session, 'do_orm_execute', intercept)
+    try:
+        await call()
+    except _Captured as captured:
+        return captured.statement
+    finally:
+        event.remove(session.sync_session, 'do_orm_execute', intercept)
+    raise RuntimeError('Функция не выполнила ни одного запроса')
+
+
+async def get_hot_queries(session: AsyncSession, values: dict) -> dict[str, Executable]:
+    """Запросы горячих путей в том виде, в каком их строит orm_requests.py."""
+    user = User(id=values['user_id'], telegram_id=values['telegram_id'])
+    calls = {
+        'orm_get_user_by_telegram': lambda: orm_get_user_by_telegram(session, values['telegram_id']),
+        'orm_get_filtered_products': lambda: orm_get_filtered_products(
+            session, values['category_id'], values['size']
+        ),
+        'orm_get_filtered_products (по цене)': lambda: orm_get_filtered_products(
+            session, values['category_id'], price_from=1000, price_to=3000, sort_by_price=True
+        ),
+        'orm_get_product_variant_by_size': lambda: orm_get_product_variant_by_size(
+            session, values['product_id'], values['size']
+        ),
+        'orm_get_or_create_cart': lambda: orm_get_or_create_cart(session, user),
+        'orm_get_cart_item': lambda: orm_get_cart_item(
+            session, values['cart_id'], values['product_id'], values['variant_id']
+        ),
+        'orm_get_reviews_for_product': lambda: orm_get_reviews_for_product(session, values['product_id']),
+        'orm_get_orders_for_user': lambda: orm_get_orders_for_user(session, user),
+        'get_popular_products (просмотры товара)': lambda: get_popular_products(session),
+        'orm_search_products': lambda: orm_search_products(session, 'куртка'),
+    }
+    return {name: await capture_statement(session, call) for name, call in calls.items()}
+
+
+def find_seq_scans(plan: dict) -> list[str]:
+    """Рекурсивно ищет узлы Seq Scan в плане EXPLAIN (FORMAT JSON)."""
+    tables = []
+    if plan.get('Node Type') == 'Seq Scan':
+        tables.append(plan.get('Relation Name'))
+    for child in plan.get('Plans', []):
+        tables.extend(find_seq_scans(child))
+    return tables
+
+
+async def check_query_plans(session: AsyncSession) -> dict[str, list[str]]:
+    """Возвращает {имя запроса: [таблицы с Seq Scan]} только для проблемных запросов."""
+    values = await get_sample_values(session)
+    problems = {}
+    for name, query in (await get_hot_queries(session, values)).items():
+        sql = query.compile(dialect=PlanDialect(), compile_kwargs={'literal_binds': True})
+        result = await session.execute(text(f'EXPLAIN (FORMAT JSON) {sql}'))
+        plan = result.scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        tables = find_seq_scans(plan[0]['Plan'])
+        if tables:
+            problems[name] = tables
+    return problems
+
+
+async def main():
+    from database.db import async_session
+
+    async with async_session() as session:
+        await session.execute(text('ANALYZE'))
+        problems = await check_query_plans(session)
+
+    if not problems:
+        print('✅ Все горячие запросы используют индексы.')
+        return
+    print('⚠️ Запросы с последовательным сканированием (Seq Scan):')
+    for name, tables in problems.items():
+        print(f'  {name}: {", ".join(tables)}')
+    raise SystemExit(1)  # чтобы проверку можно было использовать в CI
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -6,11 +6,12 @@ from sqlalchemy import select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 from analytics.analytics import get_popular_products
 from database.models import Order, User, Product
-from database.db import async_session
 from database.orm_requests import orm_add_product
 from utils.role_decorator import admin_required
 from aiogram.types import FSInputFile
 from database.orm_requests import orm_get_all_products_with_variants
+from database.cache import catalog_cache
+from services.catalog_sync import on_product_deleted
 from aiogram.types import Message
 
 
@@ -23,11 +24,10 @@ admin_router = Router()
 # =======================
 @admin_router.message(Command("list_users"))
 @admin_required
-async def list_users_handler(message: types.Message):
+async def list_users_handler(message: types.Message, session: AsyncSession):
     """Выводит список всех зарегистрированных пользователей."""
-    async with async_session() as session:
-        result = await session.execute(select(User))
-        users = result.scalars().all()
+    result = await session.execute(select(User))
+    users = result.scalars().all()
     if users:
         text = "Список пользователей:\n"
         for user in users:
@@ -40,7 +40,7 @@ async def list_users_handler(message: types.Message):
 
 @admin_router.message(Command("user_details"))
 @admin_required
-async def user_details_handler(message: types.Message):
+async def user_details_handler(message: types.Message, session: AsyncSession):
     """Выводит подробности о пользователе.
     Ожидается: /user_details <user_id>
     Пример: /user_details 4 (ID в БД, а не Telegram ID)
@@ -51,9 +51,8 @@ async def user_details_handler(message: types.Message):
         return
     try:
         user_id = int(parts[1])
-        async with async_session() as session:
-            result = await session.execute(select(User).where(User.id == user_id))
-            user = result.scalar()
+        result = await session.execute(select(User).where(User.id == user_id))
+        user = result.scalar()
         if user:
             text = (
                 f"Детали пользователя:\n"
@@ -74,7 +73,7 @@ async def user_details_handler(message: types.Message):
 # Команда для удаления товара (базовый пример)
 @admin_router.message(Command("delete_product"))
 @admin_required
-async def delete_product_handler(message: types.Message):
+async def delete_product_handler(message: types.Message, session: AsyncSession):
     # Ожидается: /delete_product <id>
     parts = message.text.split()
     if len(parts) != 2:
@@ -82,15 +81,15 @@ async def delete_product_handler(message: types.Message):
         return
     try:
         product_id = int(parts[1])
-        async with async_session() as session:
-            result = await session.execute(select(Product).where(Product.id == product_id))
-            product = result.scalar()
-            if product:
-                await session.delete(product)
-                await session.commit()
-                await message.answer(f"Продукт с id {product_id} удален.")
-            else:
-                await message.answer("Продукт не найден.")
+        result = await session.execute(select(Product).where(Product.id == product_id))
+        product = result.scalar()
+        if product:
+            await session.delete(product)
+            await session.commit()
+            on_product_deleted(product_id, product.category_id)
+            await message.answer(f"Продукт с id {product_id} удален.")
+        else:
+            await message.answer("Продукт не найден.")
     except Exception as e:
         await message.answer("Ошибка при удалении продукта.")
 
@@ -156,11 +155,10 @@ async def list_all_products(message: Message, session: AsyncSession):
 
 @admin_router.message(Command("list_orders"))
 @admin_required
-async def list_orders_handler(message: types.Message):
+async def list_orders_handler(message: types.Message, session: AsyncSession):
     """Выводит список всех заказов."""
-    async with async_session() as session:
-        result = await session.execute(select(Order))
-        orders = result.scalars().all()
+    result = await session.execute(select(Order))
+    orders = result.scalars().all()
     if orders:
         text = "Список заказов:\n"
         for order in orders:
@@ -174,7 +172,7 @@ async def list_orders_handler(message: types.Message):
 
 @admin_router.message(Command("order_details"))
 @admin_required
-async def order_details_handler(message: types.Message):
+async def order_details_handler(message: types.Message, session: AsyncSession):
     """Выводит подробности заказа по ID.
     Ожидается формат: /order_details <order_id>
     """
@@ -184,9 +182,8 @@ async def order_details_handler(message: types.Message):
         return
     try:
         order_id = int(parts[1])
-        async with async_session() as session:
-            result = await session.execute(select(Order).where(Order.id == order_id))
-            order = result.scalar()
+        result = await session.execute(select(Order).where(Order.id == order_id))
+        order = result.scalar()
         if order:
             text = (
                 f"Детали заказа {order.id}:\n"
@@ -205,7 +202,7 @@ async def order_details_handler(message: types.Message):
 
 @admin_router.message(Command("update_order"))
 @admin_required
-async def update_order_handler(message: types.Message):
+async def update_order_handler(message: types.Message, session: AsyncSession):
     """
     Обновляет статус заказа.
     Ожидается формат: /update_order <order_id> <new_status> [yes/no]
@@ -221,15 +218,14 @@ async def update_order_handler(message: types.Message):
         is_paid = None
         if len(parts) == 4:
             is_paid = True if parts[3].lower() == "yes" else False
-        async with async_session() as session:
-            # Обновление shipping_status
-            stmt = update(Order).where(Order.id == order_id).values(shipping_status=new_status)
-            await session.execute(stmt)
-            # Если указан параметр оплаты, обновляем его
-            if is_paid is not None:
-                stmt2 = update(Order).where(Order.id == order_id).values(is_paid=is_paid)
-                await session.execute(stmt2)
-            await session.commit()
+        # Обновление shipping_status
+        stmt = update(Order).where(Order.id == order_id).values(shipping_status=new_status)
+        await session.execute(stmt)
+        # Если указан параметр оплаты, обновляем его
+        if is_paid is not None:
+            stmt2 = update(Order).where(Order.id == order_id).values(is_paid=is_paid)
+            await session.execute(stmt2)
+        await session.commit()
         await message.answer(f"Заказ {order_id} обновлен: статус '{new_status}', оплата: {is_paid if is_paid is not None else 'без изменений'}.")
     except Exception as e:
         await message.answer("Ошибка при обновлении заказа.")
@@ -237,13 +233,12 @@ async def update_order_handler(message: types.Message):
 
 @admin_router.message(Command("popular_products"))
 @admin_required
-async def popular_products_handler(message: types.Message):
+async def popular_products_handler(message: types.Message, session: AsyncSession):
     """
     Выводит список самых популярных товаров по количеству просмотров.
     Использует модуль аналитики для получения статистики.
     """
-    async with async_session() as session:
-        popular = await get_popular_products(session, limit=5)
+    popular = await get_popular_products(session, limit=5)
     if popular:
         text = "Наиболее популярные товары:\n"
         for product, count in popular:
@@ -251,3 +246,18 @@ async def popular_products_handler(message: types.Message):
         await message.answer(text)
     else:
         await message.answer("Нет данных о просмотрах товаров.")
+
+
+@admin_router.message(Command("cache_stats"))
+@admin_required
+async def cache_stats_handler(message: types.Message):
+    """Показывает счётчики попаданий и промахов кэша каталога."""
+    stats = catalog_cache.stats()
+    await message.answer(
+        f"Кэш каталога:\n"
+        f"Попаданий: {stats['hits']}\n"
+        f"Промахов: {stats['misses']}\n"
+        f"Доля попаданий: {stats['hit_rate']:.1%}\n"
+        f"Записей: {stats['size']}/{stats['maxsize']}\n"
+        f"TTL: {stats['ttl']} сек."
+    )
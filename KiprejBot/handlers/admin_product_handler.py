@@ -9,7 +9,8 @@ from aiogram.fsm.context import FSMContext
 from aiogram.types import Message, CallbackQuery, ContentType
 from sqlalchemy.ext.asyncio import AsyncSession
 from database.models import Product, Category, ProductImage, ProductVariant
-from database.orm_requests import orm_delete_product, orm_delete_product_images, orm_delete_product_variants, orm_get_all_categories, orm_get_all_products, orm_get_category_by_name, orm_save_product_image
+from utils.product_photos import get_photo_input, remember_file_id
+from database.orm_requests import orm_delete_product, orm_delete_product_images, orm_delete_product_variants, orm_get_all_categories, orm_get_all_products, orm_get_category_by_name, orm_add_product_images, orm_remove_unused_image_files
 from keyboards.admin_keyboards import (
     product_menu,
     get_category_keyboard,
@@ -19,12 +20,15 @@ from keyboards.admin_keyboards import (
 from utils.role_decorator import admin_required
 from utils.validation import is_valid_integer
 from database.orm_requests import orm_get_product_by_id
+from services.catalog_sync import on_product_changed, on_product_deleted
 import os
-from config import UPLOAD_DIR  # если нужно указывать путь до файлов локально
 
 
 admin_router_product_handler = Router()  # Создаём роутер для управления товарами
 
+# Сколько фото товара скачивать с серверов Telegram одновременно
+IMAGE_DOWNLOAD_CONCURRENCY = 5
+
 
 def format_product_info(product: Product, category_name: str = None) -> str:
     return (
@@ -337,11 +341,14 @@ async def confirm_cancel_product(message: Message, state: FSMContext, session: A
         session.add(new_product)
         await session.commit()
 
-        # Проверка изображений, загрузка изображений, сохранение, получение пути к изобр.
+        # Проверка изображений, загрузка изображений (несколько одновременно),
+        # фото сохраняются одним commit вместе с вариантами
+        failed_images = []
         if "images" in data and data["images"]:
-            for file_id in data["images"]:
-                file = await message.bot.get_file(file_id)
-                await orm_save_product_image(file, new_product.id, session, message.bot)
+            failed_images = await orm_add_product_images(
+                session, message.bot, new_product.id, data["images"],
+                max_concurrency=IMAGE_DOWNLOAD_CONCURRENCY
+            )
 
         # Проверяем варианты товара
         if "variants" in data and data["variants"]:
@@ -350,7 +357,13 @@ async def confirm_cancel_product(message: Message, state: FSMContext, session: A
                 session.add(new_variant)
 
         await session.commit()
+        await on_product_changed(session, new_product.id, category.id)
         await message.answer("✅ Товар добавлен!", reply_markup=product_menu)
+        if failed_images:
+            await message.answer(
+                "⚠️ Не удалось сохранить фото:\n" +
+                "\n".join(f"Фото {number}: {error}" for number, error in failed_images)
+            )
 
         await state.clear()
 
@@ -462,13 +475,9 @@ async def handle_view_product(message: Message, state: FSMContext, session: Asyn
     # Отправляем одно фото, если есть
     if product.images:
         first_image = product.images[0]
-        if first_image.image_url.startswith("AgAC"):
-            await message.answer_photo(photo=first_image.image_url)
-        else:
-            path = os.path.join(UPLOAD_DIR, first_image.image_url)
-            if os.path.exists(path):
-                with open(path, "rb") as f:
-                    await message.answer_photo(photo=f)
+        if first_image.file_id or os.path.exists(first_image.image_url):
+            sent = await message.answer_photo(photo=get_photo_input(first_image))
+            await remember_file_id(session, first_image, sent)
 
     # Показываем варианты
     if product.variants:
@@ -547,6 +556,8 @@ async def apply_field_change(message: Message, state: FSMContext, session: Async
         await state.clear()
         return
 
+    old_category_id = product.category_id
+
     # Обработка категории отдельно (по имени)
     if field == "category":
         category = await orm_get_category_by_name(session, category_name=new_value)
@@ -564,6 +575,7 @@ async def apply_field_change(message: Message, state: FSMContext, session: Async
         setattr(product, field, new_value)  # Установить значение new_value в атрибут field объекта product
 
     await session.commit()
+    await on_product_changed(session, product_id, old_category_id, product.category_id)
     await message.answer("✅ Изменения успешно сохранены!", reply_markup=product_menu)
     await state.clear()
 
@@ -672,6 +684,7 @@ async def save_updated_variant(message: Message, state: FSMContext, session: Asy
             return
 
         await session.commit()
+        await on_product_changed(session, product.id, product.category_id)
         await message.answer("✅ Вариант товара успешно обновлён!", reply_markup=product_menu)
     except Exception as e:
         await message.answer(f"Ошибка при обновлении: {e}")
@@ -706,17 +719,20 @@ async def handle_delete_product(message: Message, state: FSMContext, session: As
         await state.clear()
         return
 
-    # Удаление изображений из файловой системы (фото хранились локально)
-    for image in product.images:
-        if not image.image_url.startswith("AgAC"):  # Telegram file_id обычно начинается с AgAC
-            path = os.path.join(UPLOAD_DIR, image.image_url)
-            if os.path.exists(path):
-                os.remove(path)
+    # Файлы фото запоминаем до удаления записей: одинаковые фото у разных
+    # товаров хранятся один раз, удалить их можно только когда не останется ссылок
+    image_files = [
+        (image.content_hash, image.get_paths())
+        for image in product.images
+        if not image.image_url.startswith("AgAC")  # Telegram file_id обычно начинается с AgAC
+    ]
 
     # Удаляем все связанные объекты (варианты и изображения)
     await orm_delete_product_images(session, product_id)
     await orm_delete_product_variants(session, product_id)
-    await orm_delete_product(session, product)
+    await orm_delete_product(session, product_id)
+    on_product_deleted(product_id, product.category_id)
+    await orm_remove_unused_image_files(session, image_files)
 
     await session.commit()
     await message.answer("🗑 Товар и все связанные с ним данные удалены.", reply_markup=product_menu)
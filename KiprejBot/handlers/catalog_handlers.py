@@ -1,17 +1,108 @@
 from aiogram import Router, F
-from aiogram.types import Message, CallbackQuery
+from aiogram.types import Message, CallbackQuery, InputMediaPhoto
 from aiogram.fsm.context import FSMContext
 from sqlalchemy.ext.asyncio import AsyncSession
 from keyboards.catalog_keyboards import get_category_inline_keyboard, get_pagination_keyboard
-from utils.callback_data_filters import CategoryCallbackFactory
-from database.orm_requests import orm_get_available_sizes, orm_get_filtered_products
-from keyboards.catalog_keyboards import get_size_selection_inline_keyboard
-from utils.product_card_formatter import format_product_card_text
-from utils.pagination import custom_pagination
+from utils.callback_data_filters import CategoryCallbackFactory, ProductCardCallbackFactory
+from database.orm_requests import (orm_get_facet_counts, orm_get_filtered_products_cached,
+                                   get_price_bucket_range, orm_get_product_by_id,
+                                   orm_get_carousel_product)
+from keyboards.catalog_keyboards import get_size_selection_inline_keyboard, get_carousel_keyboard
+from utils.product_card_formatter import render_product_card, render_product_card_text
+from services.catalog_engine import catalog_engine
+from utils.product_photos import get_photo_input, remember_file_id, remember_file_ids
+from config import CATALOG_VIEW_MODE
 
 
 catalog_router = Router()
 
+# Количество товаров на одной странице каталога
+CATALOG_PAGE_SIZE = 10
+
+# Telegram принимает в альбом (sendMediaGroup) от 2 до 10 фото
+ALBUM_MAX_SIZE = 10
+
+# Сколько соседних товаров карусель подгружает заранее
+CAROUSEL_PREFETCH = 2
+
+
+def get_selected_variant(product, selected_size: str = ''):
+    """Первый вариант товара выбранного размера, None если размер не выбран."""
+    if not selected_size:
+        return None
+    return next((v for v in product.variants if v.size == selected_size), None)
+
+
+async def send_product_card(
+    message: Message,
+    product,
+    selected_size: str = '',
+    session: AsyncSession | None = None
+) -> None:
+    """Отправляет карточку товара: первое фото, описание и кнопки.
+
+    Фото отправляется по file_id, а если его ещё нет — файлом с диска,
+    после чего полученный file_id сохраняется через session.
+    """
+    images = product.images
+    if not images:
+        return  # можно также показать заглушку "Нет фото"
+
+    # Выбираем первую картинку
+    image = images[0]
+
+    # Получаем первый подходящий вариант (по размеру) Если пользователь нажал "Показать всё", и размер не выбран (size == ''), то ты можешь не находить variant, а просто передавать None в format_product_card_text
+    variant = get_selected_variant(product, selected_size)
+
+    # Текст и кнопки берём готовыми из кэша (ключ учитывает версию товара)
+    caption, keyboard = render_product_card(product, variant, total_images=len(images))
+
+    sent = await message.answer_photo(
+        photo=get_photo_input(image),
+        caption=caption,
+        parse_mode='HTML',
+        reply_markup=keyboard
+    )
+    await remember_file_id(session, image, sent)
+
+
+async def send_products_album(message: Message, products: list, session: AsyncSession | None = None) -> list[int]:
+    """Отправляет товары страницы альбомами (до 10 фото за один запрос)
+    с короткими подписями: номер, название и цена. В альбомах идут
+    миниатюры, полное фото показывается в карточке товара.
+
+    Возвращает id показанных товаров в порядке номеров, товары без фото
+    пропускаются.
+    """
+    products = [product for product in products if product.images]
+    sent_photos = []
+    for start in range(0, len(products), ALBUM_MAX_SIZE):
+        chunk = products[start:start + ALBUM_MAX_SIZE]
+        if len(chunk) == 1:
+            # Альбом из одного фото Telegram не принимает
+            sent = await message.answer_photo(
+                photo=get_photo_input(chunk[0].images[0], thumbnail=True),
+                caption=f'{start + 1}. {chunk[0].name} — от {chunk[0].price} ₽'
+            )
+            sent_photos.append((chunk[0].images[0], sent))
+            continue
+
+        media = [
+            InputMediaPhoto(
+                media=get_photo_input(product.images[0], thumbnail=True),
+                caption=f'{number}. {product.name} — от {product.price} ₽'
+            )
+            for number, product in enumerate(chunk, start=start + 1)
+        ]
+        sent_messages = await message.answer_media_group(media=media)
+        sent_photos.extend(
+            (product.images[0], sent) for product, sent in zip(chunk, sent_messages)
+        )
+
+    # file_id всех альбомов страницы — одним запросом после отправки
+    await remember_file_ids(session, sent_photos, thumbnail=True)
+    return [product.id for product in products]
+
 
 @catalog_router.message(F.text == "🏬 Каталог")
 async def show_catalog(message: Message, session: AsyncSession):
@@ -31,9 +122,15 @@ async def show_size_options(
 ):
     """Pass"""
     category_id = callback_data.category_id
-    sizes = await orm_get_available_sizes(session, category_id)
+    # Количество товаров по каждому размеру и ценовому диапазону,
+    # чтобы не вести в пустые страницы
+    facets = await orm_get_facet_counts(session, category_id)
+    if catalog_engine.ready:
+        size_counts = catalog_engine.size_counts(category_id)
+    else:
+        size_counts = facets['sizes']
 
-    keyboard = await get_size_selection_inline_keyboard(category_id, sizes)
+    keyboard = get_size_selection_inline_keyboard(category_id, size_counts, facets['prices'])
 
     # ведём диалог с пользователем в этом же сообщении, меняем текст
     await callback.message.edit_text(
@@ -53,55 +150,144 @@ async def show_filtered_products(
     """
     Показывает список товаров по выбранной категории и размеру.
     """
+    if CATALOG_VIEW_MODE == 'carousel':
+        await show_carousel_card(callback, callback_data, session, edit=False)
+        return
+
     category_id = callback_data.category_id
     selected_size = callback_data.size
     page = callback_data.page
+    before_id = callback_data.before_id
+    after_id = callback_data.after_id
+    sort = callback_data.sort
+    price = callback_data.price
 
-    # Получаем все отфильтрованные товары
-    products = await orm_get_filtered_products(session, category_id, selected_size)
+    # Получаем только товары текущей страницы, начиная с курсора: через
+    # индексы в памяти, если движок каталога включён, иначе через кэш и БД.
+    # Движок не знает цен, поэтому сортировка и фильтр по цене — только в БД
+    if catalog_engine.ready and not sort and price < 0:
+        products_on_page, has_more = await catalog_engine.get_filtered_products(
+            session, category_id, selected_size,
+            after_id=after_id, before_id=before_id, page_size=CATALOG_PAGE_SIZE
+        )
+    else:
+        price_from, price_to = get_price_bucket_range(price)
+        products_on_page, has_more = await orm_get_filtered_products_cached(
+            session, category_id, selected_size,
+            after_id=after_id, before_id=before_id, page_size=CATALOG_PAGE_SIZE,
+            price_from=price_from, price_to=price_to, sort_by_price=sort == 'p'
+        )
 
-    if not products:
-        await callback.answer("Нет товаров по выбранным параметрам.", show_alert=True)
+    if not products_on_page:
+        if page == 1:
+            await callback.answer("Нет товаров по выбранным параметрам.", show_alert=True)
+        else:
+            await callback.answer("На этой странице нет товаров.", show_alert=True)
         return
 
-    # Показываем только одну страницу с 10 товарами
-    products_on_page = custom_pagination(products, page=page, page_size=10)
+    # При листании назад has_more означает, что есть страницы ещё раньше
+    if before_id:
+        has_prev, has_next = has_more, True
+    else:
+        has_prev, has_next = after_id > 0, has_more
 
-    if not products_on_page:
-        await callback.answer("На этой странице нет товаров.", show_alert=True)
+    # Показываем все товары страницы: альбомом или отдельными карточками
+    album_ids = None
+    if CATALOG_VIEW_MODE == 'album':
+        album_ids = await send_products_album(callback.message, products_on_page, session)
+    else:
+        for product in products_on_page:
+            await send_product_card(callback.message, product, selected_size, session)
+
+    # Показываем клавиатуру пагинации (т е кнопки вперёд-назад)
+    pagination_keyboard = get_pagination_keyboard(
+        category_id, selected_size, page,
+        first_id=products_on_page[0].id,
+        last_id=products_on_page[-1].id,
+        has_prev=has_prev,
+        has_next=has_next,
+        sort=sort,
+        price=price,
+        product_ids=album_ids
+    )
+
+    await callback.message.answer(
+        text='Нажмите номер товара, чтобы открыть карточку:' if album_ids else 'Страница:',
+        reply_markup=pagination_keyboard
+    )
+
+    await callback.answer()
+
+
+@catalog_router.callback_query(ProductCardCallbackFactory.filter(F.action == 'open'))
+async def open_product_card(
+    callback: CallbackQuery,
+    callback_data: ProductCardCallbackFactory,
+    session: AsyncSession
+):
+    """Открывает карточку товара по номеру из альбома страницы каталога."""
+    product = await orm_get_product_by_id(session, callback_data.product_id)
+    if not product:
+        await callback.answer("Товар больше не доступен.", show_alert=True)
         return
 
-    # Показываем первый товар (или все, если хочешь постранично)
-    for product in products_on_page:
-        images = product.images
-        if not images:
-            continue  # можно также показать заглушку "Нет фото"
+    await send_product_card(callback.message, product, session=session)
+    await callback.answer()
 
-        # Выбираем первую картинку
-        image = images[0].file_path
 
-        # Получаем первый подходящий вариант (по размеру) Если пользователь нажал "Показать всё", и размер не выбран (size == ''), то ты можешь не находить variant, а просто передавать None в format_product_card_text
-        variant = next((v for v in product.variants if v.size == selected_size), None) if selected_size else None
 
-        # Формируем текст и кнопки
-        caption = format_product_card_text(
-            product, variant, image_index=0, total_images=len(images)
-            )
-        keyboard = get_product_card_keyboard(product.id, total_images=len(images))
+@catalog_router.callback_query(CategoryCallbackFactory.filter(F.action == 'card'))
+async def change_carousel_card(
+    callback: CallbackQuery,
+    callback_data: CategoryCallbackFactory,
+    session: AsyncSession
+):
+    """Режим карусели: ◀️/▶️ меняют товар в том же сообщении."""
+    await show_carousel_card(callback, callback_data, session, edit=True)
 
-        await callback.message.answer_photo(
-            photo=image,
-            caption=caption,
-            parse_mode='HTML',
-            reply_markup=keyboard
-        )
 
-    # Показываем клавиатуру пагинации (т е кнопки вперёд-назад)
-    pagination_keyboard = get_pagination_keyboard(category_id, selected_size, page)
+async def show_carousel_card(
+    callback: CallbackQuery,
+    callback_data: CategoryCallbackFactory,
+    session: AsyncSession,
+    edit: bool
+) -> None:
+    """Показывает один товар выдачи после after_id (или перед before_id):
+    новым сообщением (edit=False) или заменой фото и подписи (edit=True)."""
+    price_from, price_to = get_price_bucket_range(callback_data.price)
+    product, has_prev, has_next = await orm_get_carousel_product(
+        session, callback_data.category_id, callback_data.size,
+        after_id=callback_data.after_id, before_id=callback_data.before_id,
+        price_from=price_from, price_to=price_to,
+        sort_by_price=callback_data.sort == 'p', prefetch=CAROUSEL_PREFETCH
+    )
+    if product is None:
+        await callback.answer("Нет товаров по выбранным параметрам.", show_alert=True)
+        return
+    if not product.images:
+        # Фото удалили после того, как товар попал в кэш карусели
+        await callback.answer(f"У товара «{product.name}» нет фото.", show_alert=True)
+        return
 
-    await callback.message.answer(
-        text='Страница:',
-        reply_markup=pagination_keyboard
+    image = product.images[0]
+    caption = render_product_card_text(
+        product, get_selected_variant(product, callback_data.size),
+        image_index=0, total_images=len(product.images)
+    )
+    keyboard = get_carousel_keyboard(
+        product.id, len(product.images), callback_data.category_id, callback_data.size,
+        position=callback_data.page, has_prev=has_prev, has_next=has_next,
+        sort=callback_data.sort, price=callback_data.price
     )
 
+    if edit:
+        sent = await callback.message.edit_media(
+            media=InputMediaPhoto(media=get_photo_input(image), caption=caption, parse_mode='HTML'),
+            reply_markup=keyboard
+        )
+    else:
+        sent = await callback.message.answer_photo(
+            photo=get_photo_input(image), caption=caption, parse_mode='HTML', reply_markup=keyboard
+        )
+    await remember_file_id(session, image, sent)
     await callback.answer()
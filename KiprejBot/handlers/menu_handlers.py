@@ -8,7 +8,6 @@ from keyboards.admin_keyboards import product_menu, admin_main_menu
 from utils.user_check import is_admin, is_registered
 from sqlalchemy.ext.asyncio import AsyncSession
 from database.models import User  # Импорт модели пользователя
-from database.db import async_session  # Импорт сессии для работы с БД
 from utils.navigation import go_to_main_menu
 from utils.role_decorator import admin_required
 from keyboards.admin_keyboards import admin_main_menu, category_menu, product_menu
@@ -3,19 +3,30 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from aiogram.types import (CallbackQuery, InlineKeyboardMarkup,
                            InlineKeyboardButton, InputMediaPhoto)
 from utils.callback_data_filters import ProductCardCallbackFactory
-from database.orm_requests import (orm_get_product_with_images,
-                                   orm_get_available_sizes_for_product,
-                                   orm_add_product_to_cart
+from database.orm_requests import (orm_get_product_with_images_cached,
+                                   orm_get_variant_options,
+                                   orm_add_product_to_cart,
+                                   orm_add_variant_to_cart
                                    )
 from keyboards.product_card_keyboards import (
     get_quantity_keyboard,
     get_size_keyboard,
     get_photo_navigation_keyboard
 )
+from utils.product_photos import get_photo_input, remember_file_id
+from utils.product_card_formatter import render_product_card_text
+from services.reservations import OutOfStockError
+from services.identity import Identity, invalidate_identity
+from services.catalog_sync import on_stock_changed
 
 product_card_router = Router()
 
 
+def is_photo_row(row: list[InlineKeyboardButton]) -> bool:
+    """Ряд кнопок листания фото (product:photo:...)."""
+    return any((button.callback_data or '').startswith('product:photo:') for button in row)
+
+
 # Обработчик: product:photo — листание фотографий
 @product_card_router.callback_query(ProductCardCallbackFactory.filter(F.action == 'photo'))
 async def change_product_photo(callback: CallbackQuery, callback_data: ProductCardCallbackFactory, session: AsyncSession):
@@ -24,30 +35,37 @@ async def change_product_photo(callback: CallbackQuery, callback_data: ProductCa
     product_id = callback_data.product_id
     image_index = callback_data.image_index
 
-    # Получаем товар с фотографиями из БД
-    product, images = await orm_get_product_with_images(product_id, session)
+    # Получаем товар с фотографиями (из кэша, в БД только при первом листании)
+    product, images = await orm_get_product_with_images_cached(product_id, session)
 
     if not images:
         await callback.answer(f'Нет изображений товара.')
         return
 
     # Корректируем индекс, чтобы листать по кругу
-    image_index = image_index % len(image_index)
+    image_index = image_index % len(images)
 
     # Получаем текущее фото
-    current_photo = images[image_index].file_path
-
-    keyboard = await get_photo_navigation_keyboard((product_id, image_index, images))
-
-    # Редактируем фото в том же сообщении
-    await callback.message.edit_media(
+    current_photo = images[image_index]
+
+    # Меняем только ряд кнопок листания фото, остальные кнопки карточки
+    # (выбор размера, листание товаров в карусели) оставляем как были
+    photo_row = get_photo_navigation_keyboard(product_id, image_index, images).inline_keyboard[0]
+    rows = callback.message.reply_markup.inline_keyboard if callback.message.reply_markup else [photo_row]
+    keyboard = InlineKeyboardMarkup(inline_keyboard=[
+        photo_row if is_photo_row(row) else row for row in rows
+    ])
+
+    # Редактируем фото в том же сообщении (по file_id, если он уже есть)
+    edited = await callback.message.edit_media(
         media=InputMediaPhoto(
-            media=current_photo,
-            caption=f'<b>{product.name}</b>\n\n{product.description}',
+            media=get_photo_input(current_photo),
+            caption=render_product_card_text(product, None, image_index, len(images)),
             parse_mode='HTML'
         ),
         reply_markup=keyboard
     )
+    await remember_file_id(session, current_photo, edited)
 
     await callback.answer()
 
@@ -59,13 +77,14 @@ async def choose_size(callback: CallbackQuery, callback_data: ProductCardCallbac
 
     product_id = callback_data.product_id
 
-    # Получаем список доступных размеров товара
-    sizes = await orm_get_available_sizes_for_product(product_id, session)
+    # Получаем варианты товара (id, размер, цвет, версия) одним лёгким запросом
+    variants = await orm_get_variant_options(product_id, session)
 
     # Генерируем кнопки размеров списковым включением
     # При нажатии на конкретный размер, мы переходим на следующий этап — выбор
-    # количества. То есть действие меняется на quantity
-    keyboard = await get_size_keyboard(product_id, sizes)
+    # количества. То есть действие меняется на quantity, а id варианта
+    # едет дальше в callback_data
+    keyboard = get_size_keyboard(product_id, variants)
 
     # edit_reply_markup() - поменять кнопки и оставить текст нетронутым
     await callback.message.edit_reply_markup(reply_markup=keyboard)
@@ -81,7 +100,9 @@ async def choose_quantity(callback: CallbackQuery, callback_data: ProductCardCal
     size = callback_data.size
     quantity = callback_data.quantity
 
-    keyboard = await get_quantity_keyboard(product_id, size, quantity)
+    keyboard = get_quantity_keyboard(
+        product_id, size, quantity, callback_data.variant_id, callback_data.version
+    )
 
     # Меняем только inline-кнопки у текущего сообщения, не трогаем текст
     await callback.message.edit_reply_markup(reply_markup=keyboard)
@@ -92,17 +113,42 @@ async def choose_quantity(callback: CallbackQuery, callback_data: ProductCardCal
 
 # Обработчик: product:add — добавление в корзину
 @product_card_router.callback_query(ProductCardCallbackFactory.filter(F.action == 'add'))
-async def add_to_card(callback: CallbackQuery, callback_data: ProductCardCallbackFactory, session: AsyncSession):
+async def add_to_card(callback: CallbackQuery, callback_data: ProductCardCallbackFactory,
+                      session: AsyncSession, identity: Identity):
     """Добавление товара в корзину."""
 
     user_id = callback.from_user.id
     product_id = callback_data.product_id
     size = callback_data.size
     quantity = callback_data.quantity
+    if quantity < 1:
+        await callback.answer('Некорректное количество товара.', show_alert=True)
+        return
 
-    # Добавляем в корзину (функцию напишем позже)
-    await orm_add_product_to_cart(user_id, product_id, size, quantity, session)
-
+    try:
+        if callback_data.variant_id:
+            # Вариант известен из кнопки: один INSERT ... ON CONFLICT
+            added = await orm_add_variant_to_cart(session, user_id, callback_data.variant_id, quantity)
+        else:
+            # Кнопки из старых сообщений: ищем вариант по размеру
+            await orm_add_product_to_cart(user_id, product_id, size, quantity, session)
+            added = None
+    except OutOfStockError:
+        await callback.answer('Недостаточно товара на складе 😔', show_alert=True)
+        return
+    except ValueError:
+        await callback.answer('Этот товар больше недоступен.', show_alert=True)
+        return
+    if identity.cart_id is None:
+        invalidate_identity(user_id)  # корзина только что создана
+    await on_stock_changed(session)  # если вариант закончился — сбросить кэш каталога
+
+    if added is not None and added.version != callback_data.version:
+        await callback.answer(
+            f'Добавлено в корзину 🛒\nТовар обновился, актуальная цена: {added.final_price} ₽',
+            show_alert=True
+        )
+        return
     await callback.answer('Добавлено в корзину 🛒', show_alert=True)
 
 
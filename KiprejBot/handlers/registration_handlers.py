@@ -12,7 +12,7 @@ from database.models import User
 from sqlalchemy.ext.asyncio import AsyncSession
 from keyboards.user_keyboards import profile_menu
 from keyboards.main_menu import get_main_menu
-from utils.user_check import is_admin, is_registered, user_check
+from services.identity import Identity, invalidate_identity
 
 
 
@@ -63,9 +63,8 @@ class Registration(StatesGroup):
 
 # @registration_router.message(Command("register"))
 @registration_router.message(lambda message: message.text == "📝 Регистрация")
-async def register_start(message: Message, state: FSMContext, session: AsyncSession):
-    user = await user_check(session, message.from_user.id)
-    if not user:
+async def register_start(message: Message, state: FSMContext, identity: Identity):
+    if not identity.is_registered:
         await message.answer(
             "Добро пожаловать в магазин!\nПожалуйста, введите ваше полное имя:"
             )
@@ -120,6 +119,7 @@ async def process_phone(message: Message, state: FSMContext, session: AsyncSessi
     # для быстрого выявления ошибок используем анотацию типов
     # session: AsyncSession = data["session"]
     await orm_register_user(session, registration_data)
+    invalidate_identity(message.from_user.id)
     info = (
         "Регистрация завершена. Проверьте введённые данные:\n"
         f"Имя: {user_data.get('full_name')}\n"
@@ -131,9 +131,8 @@ async def process_phone(message: Message, state: FSMContext, session: AsyncSessi
 
 
 @registration_router.message(lambda message: message.text == "👤 Профиль")
-async def profile_menu_handler(message: Message, session: AsyncSession):
-    user = await user_check(session, message.from_user.id)
-    if user:
+async def profile_menu_handler(message: Message, identity: Identity):
+    if identity.is_registered:
         await message.answer(
             "Вы в разделе управления профилем. Выберите действие:",
             reply_markup=profile_menu
@@ -294,6 +293,7 @@ async def delete_profile_confirm(message: Message, state: FSMContext, session: A
     confirmation = message.text.strip().lower()
     if confirmation == "удалить":
         await orm_delete_user(session, message.from_user.id)
+        invalidate_identity(message.from_user.id)
         await message.answer("Ваш аккаунт успешно удалён.")
     else:
         await message.answer("Удаление аккаунта отменено.")
@@ -1,13 +1,12 @@
 from aiogram import Router, types
 from aiogram.filters import Command
 from sqlalchemy.ext.asyncio import AsyncSession
-from database.db import async_session
 from database.orm_requests import orm_create_review, orm_get_reviews_for_product, orm_approve_review
 
 review_router = Router()
 
 @review_router.message(Command("create_review"))
-async def create_review_handler(message: types.Message):
+async def create_review_handler(message: types.Message, session: AsyncSession):
     """
     Создает отзыв.
     Ожидается формат:
@@ -28,14 +27,13 @@ async def create_review_handler(message: types.Message):
             "rating": rating,
             "comment": comment
         }
-        async with async_session() as session:
-            review = await orm_create_review(session, data)
+        review = await orm_create_review(session, data)
         await message.answer(f"Отзыв создан с id {review.id}. Он будет отображаться после модерации.")
     except Exception as e:
         await message.answer("Ошибка при создании отзыва.")
 
 @review_router.message(Command("product_reviews"))
-async def product_reviews_handler(message: types.Message):
+async def product_reviews_handler(message: types.Message, session: AsyncSession):
     """
     Показывает отзывы для указанного товара.
     Ожидается: /product_reviews <product_id>
@@ -46,8 +44,7 @@ async def product_reviews_handler(message: types.Message):
         return
     try:
         product_id = int(parts[1])
-        async with async_session() as session:
-            reviews = await orm_get_reviews_for_product(session, product_id)
+        reviews = await orm_get_reviews_for_product(session, product_id)
         if reviews:
             text = f"Отзывы для товара {product_id}:\n"
             for review in reviews:
@@ -59,7 +56,7 @@ async def product_reviews_handler(message: types.Message):
         await message.answer("Ошибка при получении отзывов.")
 
 @review_router.message(Command("approve_review"))
-async def approve_review_handler(message: types.Message):
+async def approve_review_handler(message: types.Message, session: AsyncSession):
     """
     Обновляет статус отзыва.
     Ожидается: /approve_review <review_id> <yes/no>
@@ -71,8 +68,7 @@ async def approve_review_handler(message: types.Message):
     try:
         review_id = int(parts[1])
         is_approved = True if parts[2].lower() == "yes" else False
-        async with async_session() as session:
-            await orm_approve_review(session, review_id, is_approved)
+        await orm_approve_review(session, review_id, is_approved)
         await message.answer(f"Отзыв {review_id} обновлен: одобрен = {is_approved}.")
     except Exception as e:
         await message.answer("Ошибка при обновлении отзыва.")
@@ -0,0 +1,168 @@
+import html
+from aiogram import Router, F
+from aiogram.filters import Command
+from aiogram.fsm.state import StatesGroup, State
+from aiogram.fsm.context import FSMContext
+from aiogram.types import (Message, CallbackQuery, InlineKeyboardMarkup,
+                           InlineKeyboardButton, InlineQuery,
+                           InlineQueryResultArticle, InputTextMessageContent)
+from sqlalchemy.ext.asyncio import AsyncSession
+from database.orm_requests import orm_search_products
+from handlers.catalog_handlers import send_product_card
+from utils.callback_data_filters import SearchCallbackFactory
+from aiogram.utils.deep_linking import create_start_link
+from services.search_index import search_index
+
+
+search_router = Router()
+
+# Количество найденных товаров на одной странице
+SEARCH_PAGE_SIZE = 10
+
+# Inline-подсказки: сколько результатов за раз (Telegram допускает до 50)
+# и сколько секунд Telegram может кэшировать ответ на одинаковый запрос
+INLINE_RESULTS_LIMIT = 20
+INLINE_CACHE_TIME = 300
+
+# Аргумент /start, которым кнопка inline-результата открывает карточку товара
+PRODUCT_DEEP_LINK_PREFIX = 'product_'
+
+
+class Search(StatesGroup):
+    """Хранит FSM состояние ожидания поискового запроса."""
+    query = State()
+
+
+def get_search_pagination_keyboard(page: int, has_next: bool) -> InlineKeyboardMarkup:
+    """Создаёт кнопки 'Назад' и 'Вперёд' для результатов поиска."""
+    buttons = []
+    if page > 1:
+        buttons.append(InlineKeyboardButton(
+            text='⬅️ Назад',
+            callback_data=SearchCallbackFactory(page=page - 1).pack()
+        ))
+    buttons.append(InlineKeyboardButton(text=f'Стр. {page}', callback_data='noop'))
+    if has_next:
+        buttons.append(InlineKeyboardButton(
+            text='Вперёд ➡️',
+            callback_data=SearchCallbackFactory(page=page + 1).pack()
+        ))
+    return InlineKeyboardMarkup(inline_keyboard=[buttons])
+
+
+async def send_search_results(message: Message, session: AsyncSession, text: str, page: int) -> bool:
+    """Отправляет страницу результатов поиска.
+    Возвращает False, если на странице ничего не найдено.
+    """
+    products, has_next = await orm_search_products(
+        session, text, page=page, page_size=SEARCH_PAGE_SIZE
+    )
+    if not products:
+        return False
+
+    for product in products:
+        await send_product_card(message, product, session=session)
+
+    await message.answer(
+        text=f'Результаты поиска «{text}»:',
+        reply_markup=get_search_pagination_keyboard(page, has_next)
+    )
+    return True
+
+
+@search_router.message(Command("search"))
+@search_router.message(F.text == "🔍 Поиск")
+async def search_start(message: Message, state: FSMContext, session: AsyncSession):
+    """Начало поиска. Запрос можно передать сразу: /search куртка"""
+    parts = message.text.split(maxsplit=1)
+    if message.text.startswith('/search') and len(parts) == 2:
+        await search_query_received(message, state, session, text=parts[1])
+        return
+
+    await message.answer("Введите название, бренд или описание товара:")
+    await state.set_state(Search.query)
+
+
+@search_router.message(Search.query, F.text)
+async def search_query_received(
+    message: Message,
+    state: FSMContext,
+    session: AsyncSession,
+    text: str = None
+):
+    text = (text or message.text).strip()
+    if not text:
+        await message.answer("Запрос не может быть пустым. Введите запрос ещё раз:")
+        return
+
+    # Запоминаем запрос для листания страниц результатов
+    await state.set_state(None)
+    await state.update_data(search_query=text)
+
+    if not await send_search_results(message, session, text, page=1):
+        await message.answer("По вашему запросу ничего не найдено 😔")
+
+
+@search_router.callback_query(SearchCallbackFactory.filter())
+async def search_page(
+    callback: CallbackQuery,
+    callback_data: SearchCallbackFactory,
+    state: FSMContext,
+    session: AsyncSession
+):
+    """Листание страниц результатов поиска."""
+    data = await state.get_data()
+    text = data.get('search_query')
+    if not text:
+        await callback.answer("Поиск устарел, введите запрос заново.", show_alert=True)
+        return
+
+    if not await send_search_results(callback.message, session, text, callback_data.page):
+        await callback.answer("На этой странице нет товаров.", show_alert=True)
+        return
+    await callback.answer()
+
+
+@search_router.inline_query()
+async def inline_search(inline_query: InlineQuery):
+    """Inline-поиск: @KiprejBot <запрос> показывает подходящие товары.
+
+    Ищет по индексу в памяти, без запросов к БД. Одинаковые запросы
+    Telegram кэширует у себя на INLINE_CACHE_TIME секунд.
+
+    Сообщение из inline-режима отправляет пользователь в любой чат, у бота
+    нет callback.message для его правки. Поэтому вместо кнопок карточки
+    в нём ссылка t.me/<бот>?start=product_<id>, открывающая карточку в чате с ботом.
+    """
+    offset = int(inline_query.offset or 0)
+    products = search_index.search(inline_query.query, limit=INLINE_RESULTS_LIMIT, offset=offset)
+
+    results = []
+    for product in products:
+        link = await create_start_link(inline_query.bot, f'{PRODUCT_DEEP_LINK_PREFIX}{product.id}')
+        results.append(InlineQueryResultArticle(
+            id=str(product.id),
+            title=product.name,
+            description=f"{product.brand or '—'} · {product.price} ₽",
+            input_message_content=InputTextMessageContent(
+                message_text=(
+                    f"<b>{html.escape(product.name)}</b>\n"
+                    f"<i>{html.escape(product.description or 'Без описания')}</i>\n\n"
+                    f"Бренд: {html.escape(product.brand or '—')}\n"
+                    f"Цена: от {product.price} ₽"
+                ),
+                parse_mode='HTML'
+            ),
+            reply_markup=InlineKeyboardMarkup(inline_keyboard=[[
+                InlineKeyboardButton(text='🛍 Открыть в магазине', url=link)
+            ]])
+        ))
+
+    # Если результатов ровно на страницу, Telegram запросит следующую с next_offset
+    next_offset = str(offset + INLINE_RESULTS_LIMIT) if len(products) == INLINE_RESULTS_LIMIT else ''
+    await inline_query.answer(
+        results,
+        cache_time=INLINE_CACHE_TIME,
+        is_personal=False,
+        next_offset=next_offset
+    )
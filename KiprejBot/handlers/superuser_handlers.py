@@ -1,33 +1,36 @@
 from aiogram import Router, types
 from aiogram.filters import Command
-from database.db import async_session
 from database.orm_requests import orm_get_user_by_telegram
 from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
 from database.models import User
 from utils.role_decorator import admin_required, superuser_required
 from config import ENV_ALLOWED_SUPERUSER_ID
+from services.upload_gc import collect_orphaned_uploads
+from database.db_middleware import session_usage
+from services.identity import invalidate_identity
 
 superuser_router = Router()
 
 
 
 @superuser_router.message(Command("set_me_superuser"))
-async def set_me_superuser_handler(message: types.Message):
+async def set_me_superuser_handler(message: types.Message, session: AsyncSession):
     if message.from_user.id != ENV_ALLOWED_SUPERUSER_ID:
         await message.answer("⛔ У вас нет прав для этой команды.")
         return
 
-    async with async_session() as session:
-        stmt = update(User).where(User.telegram_id == message.from_user.id).values(role="superuser")
-        await session.execute(stmt)
-        await session.commit()
+    stmt = update(User).where(User.telegram_id == message.from_user.id).values(role="superuser")
+    await session.execute(stmt)
+    await session.commit()
+    invalidate_identity(message.from_user.id)
 
     await message.answer("✅ Вы назначены суперпользователем.")
 
 
 @superuser_router.message(Command("set_role"))
 @superuser_required
-async def set_role_handler(message: types.Message):
+async def set_role_handler(message: types.Message, session: AsyncSession):
     """
     Команда для суперпользователя для обновления роли пользователя.
     Ожидается формат: /set_role <telegram_id> <role>
@@ -47,17 +50,37 @@ async def set_role_handler(message: types.Message):
     if role not in ALLOWED_ROLES:
         await message.answer(f"Роль должна быть одной из: {', '.join(ALLOWED_ROLES)}")
         return
-    async with async_session() as session:
-        user = await orm_get_user_by_telegram(session, target_telegram_id)
-        if not user:
-            await message.answer("Пользователь не найден.")
-            return
-        # Обновляем роль пользователя stmt = statement
-        stmt = update(User).where(User.id == user.id).values(role=role)
-        await session.execute(stmt)
-        await session.commit()
+    user = await orm_get_user_by_telegram(session, target_telegram_id)
+    if not user:
+        await message.answer("Пользователь не найден.")
+        return
+    # Обновляем роль пользователя stmt = statement
+    stmt = update(User).where(User.id == user.id).values(role=role)
+    await session.execute(stmt)
+    await session.commit()
+    invalidate_identity(target_telegram_id)
     await message.answer(f"Роль пользователя {user.full_name} с telegram_id {target_telegram_id} обновлена на {role}.")
 
+@superuser_router.message(Command("uploads_gc"))
+@superuser_required
+async def uploads_gc_handler(message: types.Message, session: AsyncSession):
+    """
+    Отчёт о фото товаров на диске, на которые нет ссылок в БД.
+    /uploads_gc — пробный запуск, ничего не удаляет
+    /uploads_gc run — удалить (или перенести в карантин) такие файлы
+    """
+    dry_run = message.text.split()[-1] != "run"
+    report = await collect_orphaned_uploads(session, dry_run=dry_run)
+    await message.answer(report.format())
+
+@superuser_router.message(Command("db_stats"))
+@superuser_required
+async def db_stats_handler(message: types.Message):
+    """
+    Сколько обновлений обращались к БД и сколько соединений из пула брали.
+    """
+    await message.answer(session_usage.format())
+
 @superuser_router.message(Command("broadcast"))
 async def broadcast(message: types.Message):
     # Пример: суперпользовательская команда рассылки сообщений.
@@ -1,5 +1,5 @@
-from aiogram import Router, types
-from aiogram.filters import Command
+from aiogram import Router, types, F
+from aiogram.filters import Command, CommandStart, CommandObject
 from aiogram.types import Message, CallbackQuery
 from sqlalchemy.ext.asyncio import AsyncSession
 from handlers.menu_handlers import show_main_menu
@@ -13,11 +13,27 @@ from database.db import async_session
 from database.models import Order
 from keyboards.main_menu import get_main_menu
 from utils.user_check import is_admin, is_registered
+from handlers.catalog_handlers import send_product_card
+from handlers.search_handlers import PRODUCT_DEEP_LINK_PREFIX
+from database.orm_requests import orm_get_product_by_id
 
 
 
 user_router = Router()
 
+
+# Ссылка из inline-поиска: /start product_<id> открывает карточку товара.
+# Регистрируется раньше обычного /start, который принял бы и эту команду
+@user_router.message(CommandStart(deep_link=True, magic=F.args.startswith(PRODUCT_DEEP_LINK_PREFIX)))
+async def start_product_link_handler(message: Message, command: CommandObject, session: AsyncSession):
+    product_id = command.args.removeprefix(PRODUCT_DEEP_LINK_PREFIX)
+    product = await orm_get_product_by_id(session, int(product_id)) if product_id.isdigit() else None
+    if not product:
+        await message.answer("Товар больше не доступен.")
+        await show_main_menu(message, session)
+        return
+    await send_product_card(message, product, session=session)
+
 @user_router.message(Command("start"))
 async def start_handler(message: Message, session: AsyncSession):
     # user_id = message.from_user.id
@@ -1,8 +1,9 @@
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from database.models import Category
 from sqlalchemy.ext.asyncio import AsyncSession
-from database.orm_requests import orm_get_all_categories
-from utils.callback_data_filters import CategoryCallbackFactory
+from database.orm_requests import orm_get_all_categories, get_price_bucket_label
+from utils.callback_data_filters import CategoryCallbackFactory, ProductCardCallbackFactory
+from keyboards.product_card_keyboards import get_product_card_keyboard
 
 
 async def get_category_inline_keyboard(session: AsyncSession) -> InlineKeyboardMarkup:
@@ -23,15 +24,27 @@ async def get_category_inline_keyboard(session: AsyncSession) -> InlineKeyboardM
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
 
-def get_size_selection_inline_keyboard(category_id: int, sizes: list[str]) -> InlineKeyboardMarkup:
-    """Возвращает inline-клавиатуру с размерами и кнопкой 'Показать всё'."""
+def get_size_selection_inline_keyboard(
+        category_id: int,
+        size_counts: dict[str, int],
+        price_counts: dict[int, int] | None = None) -> InlineKeyboardMarkup:
+    """Возвращает inline-клавиатуру с размерами, ценовыми диапазонами
+    и кнопкой 'Показать всё'.
+
+    size_counts: количество товаров по каждому размеру, размеры без
+                 товаров не показываются.
+    price_counts: количество товаров по номеру ценового диапазона
+                  (facets['prices'] из orm_get_facet_counts).
+    """
     keyboard = []
 
-    # для каждого размера добавляем кнопку
-    for size in sizes:
+    # для каждого размера, в котором есть товары, добавляем кнопку
+    for size, count in size_counts.items():
+        if not count:
+            continue
         keyboard.append([
             InlineKeyboardButton(
-                text=f'Размер: {size}',
+                text=f'Размер: {size} ({count})',
                 callback_data=CategoryCallbackFactory(
                     action='show',
                     category_id=category_id,
@@ -40,6 +53,22 @@ def get_size_selection_inline_keyboard(category_id: int, sizes: list[str]) -> In
             )
         ])
 
+    # Кнопки ценовых диапазонов, по возрастанию цены
+    for bucket, count in sorted((price_counts or {}).items()):
+        if not count:
+            continue
+        keyboard.append([
+            InlineKeyboardButton(
+                text=f'💰 {get_price_bucket_label(bucket)} ₽ ({count})',
+                callback_data=CategoryCallbackFactory(
+                    action='show',
+                    category_id=category_id,
+                    size='',
+                    price=bucket
+                ).pack()
+            )
+        ])
+
     # В конец клавиатуры добавим кнопку показать все размеры
     keyboard.append([
         InlineKeyboardButton(
@@ -55,12 +84,31 @@ def get_size_selection_inline_keyboard(category_id: int, sizes: list[str]) -> In
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
 
-def get_pagination_keyboard(category_id: int | None, size: str, page: int) -> InlineKeyboardMarkup:
-    """Создаёт клавиатуру с кнопками пагинации: 'Назад' и 'Вперёд'."""
+def get_pagination_keyboard(
+        category_id: int | None,
+        size: str,
+        page: int,
+        first_id: int,
+        last_id: int,
+        has_prev: bool,
+        has_next: bool,
+        sort: str = '',
+        price: int = -1,
+        product_ids: list[int] | None = None) -> InlineKeyboardMarkup:
+    """Создаёт клавиатуру с кнопками пагинации: 'Назад' и 'Вперёд',
+    и кнопкой смены сортировки.
+
+    first_id, last_id - id первого и последнего товара на текущей странице,
+    они становятся курсорами для соседних страниц.
+    sort, price - текущие сортировка и ценовой диапазон, переносятся
+    на соседние страницы.
+    product_ids - товары страницы в режиме альбома: над пагинацией
+    добавляются кнопки с их номерами, открывающие карточку товара.
+    """
     buttons = []
 
-    # Кнопка "Назад" (только если страница > 1)
-    if page > 1:
+    # Кнопка "Назад" (только если есть предыдущая страница)
+    if has_prev:
         buttons.append(
             InlineKeyboardButton(
                 text='⬅️ Назад',
@@ -68,20 +116,105 @@ def get_pagination_keyboard(category_id: int | None, size: str, page: int) -> In
                     action='show',
                     category_id=category_id,
                     size=size,
-                    page=page - 1
+                    page=max(1, page - 1),
+                    before_id=first_id,
+                    sort=sort,
+                    price=price
                 ).pack()
             )
         )
-    # Кнопка "Вперёд"
+    # Номер текущей страницы, кнопка-заглушка
     buttons.append(
+        InlineKeyboardButton(text=f'Стр. {page}', callback_data='noop')
+    )
+    # Кнопка "Вперёд" (только если страница не последняя)
+    if has_next:
+        buttons.append(
+            InlineKeyboardButton(
+                text='Вперёд ➡️',
+                callback_data=CategoryCallbackFactory(
+                    action='show',
+                    category_id=category_id,
+                    size=size,
+                    page=page + 1,
+                    after_id=last_id,
+                    sort=sort,
+                    price=price
+                ).pack()
+            )
+        )
+    # Смена сортировки начинает листание с первой страницы
+    sort_button = InlineKeyboardButton(
+        text='🆕 Сначала новые' if sort == 'p' else '💰 Сначала дешевле',
+        callback_data=CategoryCallbackFactory(
+            action='show',
+            category_id=category_id,
+            size=size,
+            sort='' if sort == 'p' else 'p',
+            price=price
+        ).pack()
+    )
+    # Номера товаров альбома, по 5 кнопок в ряд
+    product_buttons = [
         InlineKeyboardButton(
-            text='Вперёд ➡️',
-            callback_data=CategoryCallbackFactory(
-                action='show',
-                category_id=category_id,
-                size=size,
-                page=page + 1
-            ).pack()
+            text=str(number),
+            callback_data=ProductCardCallbackFactory(action='open', product_id=product_id).pack()
+        )
+        for number, product_id in enumerate(product_ids or [], start=1)
+    ]
+    rows = [product_buttons[i:i + 5] for i in range(0, len(product_buttons), 5)]
+    return InlineKeyboardMarkup(inline_keyboard=[*rows, buttons, [sort_button]])
+
+
+def get_carousel_keyboard(
+        product_id: int,
+        total_images: int,
+        category_id: int | None,
+        size: str,
+        position: int,
+        has_prev: bool,
+        has_next: bool,
+        sort: str = '',
+        price: int = -1) -> InlineKeyboardMarkup:
+    """Кнопки карточки товара в режиме карусели: листание фото и выбор
+    размера (как в обычной карточке) плюс переход к соседним товарам.
+
+    Курсором служит id показанного товара, position — его номер в выдаче.
+    """
+    card_keyboard = get_product_card_keyboard(product_id, total_images)
+
+    buttons = []
+    if has_prev:
+        buttons.append(
+            InlineKeyboardButton(
+                text='◀️ Пред.',
+                callback_data=CategoryCallbackFactory(
+                    action='card',
+                    category_id=category_id,
+                    size=size,
+                    page=max(1, position - 1),
+                    before_id=product_id,
+                    sort=sort,
+                    price=price
+                ).pack()
+            )
         )
+    buttons.append(
+        InlineKeyboardButton(text=f'Товар {position}', callback_data='noop')
     )
-    return InlineKeyboardMarkup(inline_keyboard=[buttons])
+    if has_next:
+        buttons.append(
+            InlineKeyboardButton(
+                text='След. ▶️',
+                callback_data=CategoryCallbackFactory(
+                    action='card',
+                    category_id=category_id,
+                    size=size,
+                    page=position + 1,
+                    after_id=product_id,
+                    sort=sort,
+                    price=price
+                ).pack()
+            )
+        )
+    return InlineKeyboardMarkup(inline_keyboard=[*card_keyboard.inline_keyboard, buttons])
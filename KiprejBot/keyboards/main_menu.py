@@ -14,18 +14,19 @@ def get_main_menu(is_admin=False):
     keyboard = [
         [
             KeyboardButton(text="🏬 Каталог"),
-            KeyboardButton(text="📞 Контакты")
+            KeyboardButton(text="🔍 Поиск")
         ],
         [
-            KeyboardButton(text="🚚 Доставка и оплата"),
-            KeyboardButton(text="👤 Профиль")
+            KeyboardButton(text="📞 Контакты"),
+            KeyboardButton(text="🚚 Доставка и оплата")
         ],
         [
-            KeyboardButton(text="🛍 Мои заказы"),
-            KeyboardButton(text="🏠 Мои адреса")
+            KeyboardButton(text="👤 Профиль"),
+            KeyboardButton(text="🛍 Мои заказы")
         ],
         [
-            KeyboardButton(text="📝 Регистрация"),
+            KeyboardButton(text="🏠 Мои адреса"),
+            KeyboardButton(text="📝 Регистрация")
         ],
     ]
 
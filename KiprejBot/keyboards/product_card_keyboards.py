@@ -32,26 +32,76 @@ def get_photo_navigation_keyboard(product_id: int, image_index: int, images: int
     return keyboard
 
 
-def get_size_keyboard(product_id: int, sizes: list[str]) -> InlineKeyboardMarkup:
-    """Генерирует кнопки доступных размеров вариантов."""
-    keyboard = InlineKeyboardMarkup(
-        inline_keyboard=[
+def get_product_card_keyboard(product_id: int, total_images: int) -> InlineKeyboardMarkup:
+    """Создаёт кнопки карточки товара в каталоге: листание фото и выбор размера."""
+    buttons = []
+
+    # Листать фото имеет смысл, только если их больше одного
+    if total_images > 1:
+        buttons.append([
             InlineKeyboardButton(
-                text=size,
+                text='⬅️',
                 callback_data=ProductCardCallbackFactory(
-                    action='quantity',
+                    action='photo',
                     product_id=product_id,
-                    size=size,
-                    quantity=1
+                    image_index=total_images - 1
+                ).pack()
+            ),
+            InlineKeyboardButton(
+                text='➡️',
+                callback_data=ProductCardCallbackFactory(
+                    action='photo',
+                    product_id=product_id,
+                    image_index=1
                 ).pack()
             )
-            for size in sizes
-        ]
+        ])
+
+    buttons.append([
+        InlineKeyboardButton(
+            text='📐 Выбрать размер',
+            callback_data=ProductCardCallbackFactory(
+                action='size',
+                product_id=product_id
+            ).pack()
+        )
+    ])
+    return InlineKeyboardMarkup(inline_keyboard=buttons)
+
+
+def get_size_keyboard(product_id: int, variants: list) -> InlineKeyboardMarkup:
+    """Генерирует кнопки доступных размеров вариантов.
+
+    variants: строки (id, size, color, version) из orm_get_variant_options,
+    id и версия варианта сразу попадают в callback_data.
+    """
+    buttons = [
+        InlineKeyboardButton(
+            text=f'{size} {color}' if color else size,
+            callback_data=ProductCardCallbackFactory(
+                action='quantity',
+                product_id=product_id,
+                size=size,
+                quantity=1,
+                variant_id=variant_id,
+                version=version
+            ).pack()
+        )
+        for variant_id, size, color, version in variants
+    ]
+    # по 4 кнопки в ряд
+    keyboard = InlineKeyboardMarkup(
+        inline_keyboard=[buttons[i:i + 4] for i in range(0, len(buttons), 4)]
     )
     return keyboard
 
 
-def get_quantity_keyboard(product_id: int, size: str, quantity: int) -> InlineKeyboardMarkup:
+def get_quantity_keyboard(
+        product_id: int,
+        size: str,
+        quantity: int,
+        variant_id: int = 0,
+        version: int = 0) -> InlineKeyboardMarkup:
     """Создаёт кнопки увеличения или уменьшения количества товара."""
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
         [  # Три кнопки в ряд
@@ -61,7 +111,9 @@ def get_quantity_keyboard(product_id: int, size: str, quantity: int) -> InlineKe
                     action='quantity',
                     product_id=product_id,
                     size=size,
-                    quantity=max(1, quantity - 1)  # новый колбэк с уменьшенным количеством, но не меньше 1
+                    quantity=max(1, quantity - 1),  # новый колбэк с уменьшенным количеством, но не меньше 1
+                    variant_id=variant_id,
+                    version=version
                 ).pack()
             ),
             InlineKeyboardButton(
@@ -74,7 +126,9 @@ def get_quantity_keyboard(product_id: int, size: str, quantity: int) -> InlineKe
                     action='quantity',
                     product_id=product_id,
                     size=size,
-                    quantity=quantity + 1  # на 1 больше текущего кол-ва
+                    quantity=quantity + 1,  # на 1 больше текущего кол-ва
+                    variant_id=variant_id,
+                    version=version
                 ).pack()
             )
         ],
@@ -85,7 +139,9 @@ def get_quantity_keyboard(product_id: int, size: str, quantity: int) -> InlineKe
                     action='add',
                     product_id=product_id,
                     size=size,
-                    quantity=quantity
+                    quantity=quantity,
+                    variant_id=variant_id,
+                    version=version
                 ).pack()
             )
         ]
@@ -4,10 +4,12 @@ from aiogram import Bot, Dispatcher
 from aiogram.types import BotCommand
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
 
 from config import BOT_TOKEN
-from database.db import create_db, async_session
-from database.db_middleware import DataBaseSession
+from database.db import create_db, async_session, engine
+from database.db_middleware import DataBaseSession, install_connection_guard
+from services.identity import IdentityMiddleware
 from handlers.user_handlers import user_router
 from handlers.admin_handlers import admin_router
 from handlers.superuser_handlers import superuser_router
@@ -21,6 +23,11 @@ from config import UPLOAD_DIR
 from utils.cancel_command import cancel_router
 from handlers.catalog_handlers import catalog_router
 from handlers.product_card_handlers import product_card_router
+from handlers.search_handlers import search_router
+from services.catalog_sync import reload_catalog_indexes, on_stock_changed
+from services.image_pipeline import shutdown_executor
+from services.upload_gc import collect_orphaned_uploads
+from services.reservations import expire_reservations
 
 
 print(f"📂 Директория для загрузки изображений: {UPLOAD_DIR.resolve()}")
@@ -47,10 +54,35 @@ async def scheduled_job():
 # Добавляем задачу в планировщик (каждый день в 12:00)
 scheduler.add_job(scheduled_job, CronTrigger(hour=12, minute=0, timezone="Europe/Moscow"))
 
+# Полная перезагрузка индексов каталога в памяти (страховка на случай
+# изменений в БД в обход админских хэндлеров)
+async def reload_catalog():
+    async with async_session() as session:
+        await reload_catalog_indexes(session)
+
+scheduler.add_job(reload_catalog, IntervalTrigger(minutes=30))
+
+# Раз в минуту возвращаем на склад товар из истёкших резервов корзин
+async def release_expired_reservations():
+    async with async_session() as session:
+        await expire_reservations(session)
+        await on_stock_changed(session)
+
+scheduler.add_job(release_expired_reservations, IntervalTrigger(minutes=1))
+
+# Каждую ночь убираем фото товаров, на которые не осталось ссылок в БД
+async def sweep_uploads():
+    async with async_session() as session:
+        report = await collect_orphaned_uploads(session, dry_run=False)
+    logging.info(report.format())
+
+scheduler.add_job(sweep_uploads, CronTrigger(hour=4, minute=0, timezone="Europe/Moscow"))
+
 # Устанавливаем команду "/menu" в кнопке с тремя полосками
 async def set_commands(bot: Bot):
     commands = [
         BotCommand(command='menu', description='Открыть главное меню'),
+        BotCommand(command='search', description='Поиск товаров'),
         BotCommand(command='admin_menu', description='Открыть меню администратора')  # Добавили команду для админов
     ]
     await bot.set_my_commands(commands)
@@ -60,8 +92,15 @@ async def main():
     # Создаем таблицы, если их еще нет
     await create_db()
 
+    # Загружаем индексы каталога в память (inline-поиск, битовые индексы)
+    await reload_catalog()
+
     # подключим db_middleware к основному роутеру, на самый ранний этап, но уже после прохождения всех фильтров
     dp.update.middleware(DataBaseSession(session_pool=async_session))
+    # роль, id пользователя и корзины из кэша — после сессии, она нужна при промахе
+    dp.update.middleware(IdentityMiddleware())
+    # предупреждение (или ошибка), если обновление берёт второе соединение из пула
+    install_connection_guard(engine)
     # регистрируем второй мидлваре SchedulerMiddleware, тоже на все обновления
     #dp.update.middleware(SchedulerMiddleware(scheduler))
 
@@ -77,6 +116,7 @@ async def main():
     dp.include_router(cancel_router)
     dp.include_router(catalog_router)
     dp.include_router(product_card_router)
+    dp.include_router(search_router)
 
 
     # Запускаем планировщик
@@ -88,6 +128,7 @@ async def main():
     try:
         await dp.start_polling(bot)
     finally:
+        shutdown_executor()
         await bot.session.close()
 
 if __name__ == '__main__':
@@ -0,0 +1,57 @@
+"""Уникальная позиция корзины
+
+Revision ID: 0b7d4e9a3c16
+Revises: f6c3a9d2e847
+Create Date: 2026-10-17 14:31:56.204417
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0b7d4e9a3c16'
+down_revision: Union[str, None] = 'f6c3a9d2e847'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Сливаем уже появившиеся дубли: количество складываем в самую раннюю строку
+    op.execute("""
+        UPDATE cart_items AS c
+        SET quantity = d.total
+        FROM (
+            SELECT min(id) AS id, sum(quantity) AS total
+            FROM cart_items
+            GROUP BY cart_id, product_id, variant_id
+            HAVING count(*) > 1
+        ) AS d
+        WHERE c.id = d.id
+    """)
+    op.execute("""
+        DELETE FROM cart_items AS c
+        USING cart_items AS d
+        WHERE c.cart_id = d.cart_id
+          AND c.product_id = d.product_id
+          AND c.variant_id IS NOT DISTINCT FROM d.variant_id
+          AND c.id > d.id
+    """)
+    # Уникальное ограничение заменяет обычный индекс по тем же колонкам
+    op.drop_index('ix_cart_items_cart_id_product_id_variant_id', table_name='cart_items', if_exists=True)
+    op.create_unique_constraint(
+        'uq_cart_items_cart_id_product_id_variant_id', 'cart_items',
+        ['cart_id', 'product_id', 'variant_id']
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('uq_cart_items_cart_id_product_id_variant_id', 'cart_items', type_='unique')
+    op.create_index(
+        'ix_cart_items_cart_id_product_id_variant_id', 'cart_items',
+        ['cart_id', 'product_id', 'variant_id'], unique=False
+    )
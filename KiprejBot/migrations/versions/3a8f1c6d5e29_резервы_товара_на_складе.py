@@ -0,0 +1,42 @@
+"""Резервы товара на складе
+
+Revision ID: 3a8f1c6d5e29
+Revises: 0b7d4e9a3c16
+Create Date: 2026-10-17 15:04:37.581920
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3a8f1c6d5e29'
+down_revision: Union[str, None] = '0b7d4e9a3c16'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('stock_reservations',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('variant_id', sa.Integer(), nullable=False),
+    sa.Column('cart_id', sa.Integer(), nullable=True),
+    sa.Column('quantity', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('expires_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['cart_id'], ['carts.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['variant_id'], ['product_variants.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_stock_reservations_expires_at', 'stock_reservations', ['expires_at'], unique=False)
+    op.create_index('ix_stock_reservations_cart_id_variant_id', 'stock_reservations', ['cart_id', 'variant_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_stock_reservations_cart_id_variant_id', table_name='stock_reservations')
+    op.drop_index('ix_stock_reservations_expires_at', table_name='stock_reservations')
+    op.drop_table('stock_reservations')
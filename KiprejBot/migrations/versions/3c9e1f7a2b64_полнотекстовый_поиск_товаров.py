@@ -0,0 +1,44 @@
+"""Полнотекстовый поиск товаров
+
+Revision ID: 3c9e1f7a2b64
+Revises: b41d1e132a0e
+Create Date: 2026-10-17 10:12:41.518203
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3c9e1f7a2b64'
+down_revision: Union[str, None] = 'b41d1e132a0e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('products', sa.Column(
+        'search_vector',
+        postgresql.TSVECTOR(),
+        sa.Computed(
+            "setweight(to_tsvector('russian', coalesce(name, '')), 'A') || "
+            "setweight(to_tsvector('russian', coalesce(brand, '')), 'B') || "
+            "setweight(to_tsvector('russian', coalesce(description, '')), 'C')",
+            persisted=True
+        ),
+        nullable=True
+    ))
+    op.create_index(
+        'ix_products_search_vector', 'products', ['search_vector'],
+        unique=False, postgresql_using='gin'
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_products_search_vector', table_name='products', postgresql_using='gin')
+    op.drop_column('products', 'search_vector')
@@ -0,0 +1,44 @@
+"""Итоговая цена варианта товара
+
+Revision ID: 5e8b3d1f0a27
+Revises: 7a4d2c8e91f3
+Create Date: 2026-10-17 12:14:05.318204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5e8b3d1f0a27'
+down_revision: Union[str, None] = '7a4d2c8e91f3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('product_variants', sa.Column('final_price', sa.Float(), nullable=True))
+    # Заполняем цену для уже существующих вариантов той же формулой,
+    # что и ProductVariant.get_final_price()
+    op.execute("""
+        UPDATE product_variants AS v
+        SET final_price = round(
+            ((p.price + coalesce(v.additional_price, 0))
+             * (1 - coalesce(v.discount_percent, 0) / 100))::numeric, 2
+        )
+        FROM products AS p
+        WHERE p.id = v.product_id
+    """)
+    op.create_index(
+        'ix_product_variants_product_id_final_price', 'product_variants',
+        ['product_id', 'final_price'], unique=False
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_product_variants_product_id_final_price', table_name='product_variants')
+    op.drop_column('product_variants', 'final_price')
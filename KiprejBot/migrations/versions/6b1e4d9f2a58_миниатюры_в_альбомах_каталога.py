@@ -0,0 +1,31 @@
+"""Миниатюры в альбомах каталога
+
+Revision ID: 6b1e4d9f2a58
+Revises: 8d2e5f1b7c43
+Create Date: 2026-10-17 18:05:37.215490
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6b1e4d9f2a58'
+down_revision: Union[str, None] = '8d2e5f1b7c43'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('product_images', sa.Column('thumbnail_file_id', sa.String(length=255), nullable=True))
+    # WebP-копии больше не строятся; файлы без ссылок из БД уберёт очистка папки с фото
+    op.drop_column('product_images', 'card_webp_path')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.add_column('product_images', sa.Column('card_webp_path', sa.String(length=1000), nullable=True))
+    op.drop_column('product_images', 'thumbnail_file_id')
@@ -0,0 +1,56 @@
+"""Составные индексы для частых запросов
+
+Revision ID: 7a4d2c8e91f3
+Revises: 3c9e1f7a2b64
+Create Date: 2026-10-17 11:03:27.904615
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7a4d2c8e91f3'
+down_revision: Union[str, None] = '3c9e1f7a2b64'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# (имя индекса, таблица, колонки)
+INDEXES = [
+    ('ix_product_variants_product_id_size', 'product_variants', ['product_id', 'size']),
+    ('ix_cart_items_cart_id_product_id_variant_id', 'cart_items', ['cart_id', 'product_id', 'variant_id']),
+    ('ix_reviews_product_id_is_approved', 'reviews', ['product_id', 'is_approved']),
+    ('ix_orders_user_id', 'orders', ['user_id']),
+    ('ix_product_views_product_id_view_time', 'product_views', ['product_id', 'view_time']),
+    ('ix_products_category_id_id', 'products', ['category_id', 'id']),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # В PostgreSQL строим индексы CONCURRENTLY, чтобы не блокировать
+    # запись в таблицы. Такой индекс нельзя строить внутри транзакции,
+    # поэтому выполняем его в autocommit-блоке.
+    concurrently = op.get_bind().dialect.name == 'postgresql'
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(
+                name, table, columns, unique=False,
+                postgresql_concurrently=concurrently,
+                if_not_exists=True
+            )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    concurrently = op.get_bind().dialect.name == 'postgresql'
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(
+                name, table_name=table,
+                postgresql_concurrently=concurrently,
+                if_exists=True
+            )
@@ -0,0 +1,32 @@
+"""Ключ повтора оформления заказа
+
+Revision ID: 8d2e5f1b7c43
+Revises: 3a8f1c6d5e29
+Create Date: 2026-10-17 15:41:12.904317
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8d2e5f1b7c43'
+down_revision: Union[str, None] = '3a8f1c6d5e29'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('orders', sa.Column('idempotency_key', sa.String(length=64), nullable=True))
+    op.create_unique_constraint(
+        'uq_orders_user_id_idempotency_key', 'orders', ['user_id', 'idempotency_key']
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('uq_orders_user_id_idempotency_key', 'orders', type_='unique')
+    op.drop_column('orders', 'idempotency_key')
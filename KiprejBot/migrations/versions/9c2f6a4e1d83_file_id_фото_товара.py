@@ -0,0 +1,30 @@
+"""file_id фото товара
+
+Revision ID: 9c2f6a4e1d83
+Revises: 5e8b3d1f0a27
+Create Date: 2026-10-17 12:41:52.607133
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9c2f6a4e1d83'
+down_revision: Union[str, None] = '5e8b3d1f0a27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('product_images', sa.Column('file_id', sa.String(length=255), nullable=True))
+    # В старых записях вместо пути иногда хранился сам file_id фото
+    op.execute("UPDATE product_images SET file_id = image_url WHERE image_url LIKE 'AgAC%'")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('product_images', 'file_id')
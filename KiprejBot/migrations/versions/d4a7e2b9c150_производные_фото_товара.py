@@ -0,0 +1,32 @@
+"""Производные фото товара
+
+Revision ID: d4a7e2b9c150
+Revises: 9c2f6a4e1d83
+Create Date: 2026-10-17 13:05:18.442961
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4a7e2b9c150'
+down_revision: Union[str, None] = '9c2f6a4e1d83'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('product_images', sa.Column('card_path', sa.String(length=1000), nullable=True))
+    op.add_column('product_images', sa.Column('card_webp_path', sa.String(length=1000), nullable=True))
+    op.add_column('product_images', sa.Column('thumbnail_path', sa.String(length=1000), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('product_images', 'thumbnail_path')
+    op.drop_column('product_images', 'card_webp_path')
+    op.drop_column('product_images', 'card_path')
@@ -0,0 +1,30 @@
+"""Хэш содержимого фото товара
+
+Revision ID: e1b5c8f3a692
+Revises: d4a7e2b9c150
+Create Date: 2026-10-17 13:32:40.118574
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e1b5c8f3a692'
+down_revision: Union[str, None] = 'd4a7e2b9c150'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('product_images', sa.Column('content_hash', sa.String(length=64), nullable=True))
+    op.create_index(op.f('ix_product_images_content_hash'), 'product_images', ['content_hash'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_product_images_content_hash'), table_name='product_images')
+    op.drop_column('product_images', 'content_hash')
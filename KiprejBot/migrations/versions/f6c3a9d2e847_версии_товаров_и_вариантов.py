@@ -0,0 +1,32 @@
+"""Версии товаров и вариантов
+
+Revision ID: f6c3a9d2e847
+Revises: e1b5c8f3a692
+Create Date: 2026-10-17 14:02:11.730385
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f6c3a9d2e847'
+down_revision: Union[str, None] = 'e1b5c8f3a692'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for table in ('products', 'product_variants'):
+        op.add_column(table, sa.Column('updated_at', sa.DateTime(), nullable=True))
+        op.add_column(table, sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table in ('product_variants', 'products'):
+        op.drop_column(table, 'version')
+        op.drop_column(table, 'updated_at')
@@ -0,0 +1,120 @@
+from typing import Optional
+from sqlalchemy import select, delete, func, literal
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from database.models import User, Cart, CartItem, Order, OrderItem
+from services.reservations import consume_cart_reservations, take_stock
+from services.catalog_sync import on_stock_changed
+
+
+class EmptyCartError(ValueError):
+    """В корзине нет товаров для оформления заказа."""
+
+
+async def get_order_id_by_key(session: AsyncSession, user_id: int, idempotency_key: str) -> Optional[int]:
+    """id заказа, уже оформленного пользователем (telegram_id) с этим ключом."""
+    return await session.scalar(
+        select(Order.id).join(User)
+        .where(User.telegram_id == user_id, Order.idempotency_key == idempotency_key)
+    )
+
+
+async def checkout(
+    session: AsyncSession,
+    user_id: int,
+    idempotency_key: str,
+    shipping_address: Optional[str] = None,
+    payment_method: Optional[str] = None
+) -> Order:
+    """Оформляет заказ из корзины пользователя одной транзакцией.
+
+    1. Блокирует строку корзины (SELECT ... FOR UPDATE), чтобы параллельное
+       добавление в корзину не попало между подсчётом суммы и очисткой.
+    2. Создаёт Order: сумма считается в БД из price_at_time * quantity
+       (INSERT ... SELECT ... ON CONFLICT (user_id, idempotency_key) DO NOTHING).
+    3. Переносит все позиции корзины в OrderItem одним INSERT ... SELECT.
+    4. Списывает товар: резервы корзины засчитываются, недостающее
+       (если резерв успел истечь) списывается условным UPDATE.
+    5. Очищает корзину и делает один commit.
+    После commit сбрасывает кэши каталога для закончившихся товаров.
+
+    Повтор тем же пользователем с тем же idempotency_key (например,
+    повторное нажатие кнопки или повтор после обрыва связи) возвращает уже
+    созданный заказ.
+    user_id: telegram_id пользователя.
+    EmptyCartError — корзина пуста, OutOfStockError — товара не хватает
+    (в обоих случаях ничего не меняется).
+    """
+    try:
+        # 1. Корзина пользователя под блокировкой
+        cart_id = await session.scalar(
+            select(Cart.id).join(User).where(User.telegram_id == user_id).with_for_update(of=Cart)
+        )
+        existing_id = await get_order_id_by_key(session, user_id, idempotency_key)
+        if existing_id is not None:
+            await session.rollback()  # заказ уже оформлен, ничего не меняем
+            return await session.get(Order, existing_id, populate_existing=True)
+        if cart_id is None:
+            raise EmptyCartError('Корзина пуста.')
+
+        # 2. Заказ с суммой, посчитанной в БД
+        order_insert = pg_insert(Order).from_select(
+            ['user_id', 'total_amount', 'idempotency_key', 'shipping_address', 'payment_method'],
+            select(
+                Cart.user_id,
+                func.sum(CartItem.price_at_time * CartItem.quantity),
+                literal(idempotency_key),
+                literal(shipping_address),
+                literal(payment_method)
+            )
+            .join(CartItem, CartItem.cart_id == Cart.id)
+            .where(Cart.id == cart_id)
+            .group_by(Cart.user_id)
+        )
+        order_id = await session.scalar(
+            order_insert.on_conflict_do_nothing(index_elements=[Order.user_id, Order.idempotency_key])
+            .returning(Order.id)
+        )
+        if order_id is None:
+            # Заказ с этим ключом создан параллельным запросом, либо корзина пуста
+            existing_id = await get_order_id_by_key(session, user_id, idempotency_key)
+            if existing_id is not None:
+                await session.rollback()
+                return await session.get(Order, existing_id, populate_existing=True)
+            raise EmptyCartError('Корзина пуста.')
+
+        # 3. Все позиции корзины — одним INSERT ... SELECT
+        await session.execute(
+            pg_insert(OrderItem).from_select(
+                ['order_id', 'product_id', 'variant_id', 'quantity', 'price'],
+                select(
+                    literal(order_id),
+                    CartItem.product_id,
+                    CartItem.variant_id,
+                    CartItem.quantity,
+                    CartItem.price_at_time
+                ).where(CartItem.cart_id == cart_id)
+            )
+        )
+
+        # 4. Списание со склада: резервы засчитываются, остаток списывается
+        held = await consume_cart_reservations(session, cart_id)
+        needed = await session.execute(
+            select(CartItem.variant_id, func.sum(CartItem.quantity))
+            .where(CartItem.cart_id == cart_id, CartItem.variant_id.is_not(None))
+            .group_by(CartItem.variant_id)
+        )
+        for variant_id, quantity in needed:
+            missing = quantity - held.get(variant_id, 0)
+            if missing > 0:
+                await take_stock(session, variant_id, missing)
+
+        # 5. Очистка корзины и один commit на весь заказ
+        await session.execute(delete(CartItem).where(CartItem.cart_id == cart_id))
+        await session.commit()
+    except Exception:
+        await session.rollback()
+        raise
+
+    await on_stock_changed(session)
+    return await session.get(Order, order_id, populate_existing=True)
@@ -0,0 +1,243 @@
+from array import array
+from typing import Optional
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.attributes import set_committed_value
+from database.models import Product, ProductVariant
+from database.orm_requests import get_base_product_query
+
+
+class CatalogEngine:
+    """Поиск по каталогу в памяти процесса через битовые индексы.
+
+    Битовая карта — обычное целое число Python, в котором бит с номером
+    product_id установлен, если товар подходит под условие. Индексы ведутся
+    по категории, размеру, цвету, бренду и наличию на складе. Любая
+    комбинация фильтров — это пересечение (&) нескольких чисел, а порядок
+    бит совпадает с сортировкой по Product.id, поэтому keyset-пагинация
+    делается сдвигом маски.
+
+    Сами товары (с фото и вариантами) по найденным id достаются из БД
+    одним запросом, так что результат совпадает с orm_get_filtered_products.
+    """
+
+    def __init__(self):
+        self.ready = False
+        # Компактное хранение фактов о товарах: отсортированный массив id
+        # и параллельный массив id категорий (0 — без категории)
+        self._ids = array('l')
+        self._category_ids = array('l')
+        # Варианты товара: product_id -> [(size, color, stock), ...]
+        self._variants: dict[int, list[tuple[str, Optional[str], int]]] = {}
+        self._reset_indexes()
+
+    def _reset_indexes(self) -> None:
+        self._all = 0
+        self._in_stock = 0
+        self._by_category: dict[Optional[int], int] = {}
+        self._by_size: dict[str, int] = {}
+        self._by_color: dict[str, int] = {}
+        self._by_brand: dict[str, int] = {}
+
+    # === Загрузка и обновление ===
+    async def load(self, session: AsyncSession) -> None:
+        """Полностью перестраивает индексы по данным из БД."""
+        products = (await session.execute(
+            select(Product.id, Product.category_id, Product.brand).order_by(Product.id)
+        )).all()
+        variants = (await session.execute(
+            select(ProductVariant.product_id, ProductVariant.size,
+                   ProductVariant.color, ProductVariant.stock)
+        )).all()
+
+        variants_by_product: dict[int, list] = {}
+        for product_id, size, color, stock in variants:
+            variants_by_product.setdefault(product_id, []).append((size, color, stock or 0))
+
+        self._ids = array('l')
+        self._category_ids = array('l')
+        self._variants = {}
+        self._reset_indexes()
+
+        for product_id, category_id, brand in products:
+            self._ids.append(product_id)
+            self._category_ids.append(category_id or 0)
+            self._index(product_id, category_id, brand, variants_by_product.get(product_id, []))
+
+        self.ready = True
+
+    async def refresh_product(self, session: AsyncSession, product_id: int) -> None:
+        """Перечитывает из БД один товар после его изменения админом.
+
+        Сначала читаются данные, потом индексы меняются одним синхронным
+        шагом: пока идут запросы, другие обработчики видят старое состояние
+        товара, а не товар, пропавший из каталога.
+        """
+        if not self.ready:
+            return
+        row = (await session.execute(
+            select(Product.category_id, Product.brand).where(Product.id == product_id)
+        )).first()
+        variants = []
+        if row is not None:
+            variants = (await session.execute(
+                select(ProductVariant.size, ProductVariant.color, ProductVariant.stock)
+                .where(ProductVariant.product_id == product_id)
+            )).all()
+
+        # Дальше до конца метода нет await
+        self.remove_product(product_id)
+        if row is None:
+            return  # товар удалён
+        category_id, brand = row
+        position = self._position(product_id)
+        self._ids.insert(position, product_id)
+        self._category_ids.insert(position, category_id or 0)
+        self._index(product_id, category_id, brand,
+                    [(size, color, stock or 0) for size, color, stock in variants])
+
+    def remove_product(self, product_id: int) -> None:
+        """Убирает товар из всех индексов."""
+        position = self._position(product_id)
+        if position == len(self._ids) or self._ids[position] != product_id:
+            return
+        category_id = self._category_ids[position] or None
+        del self._ids[position]
+        del self._category_ids[position]
+
+        bit = ~(1 << product_id)
+        self._all &= bit
+        self._in_stock &= bit
+        self._by_category[category_id] &= bit
+        for index in (self._by_size, self._by_color, self._by_brand):
+            for key in list(index):
+                index[key] &= bit
+                if not index[key]:
+                    del index[key]
+        self._variants.pop(product_id, None)
+
+    def _position(self, product_id: int) -> int:
+        """Бинарный поиск позиции товара в отсортированном массиве id."""
+        low, high = 0, len(self._ids)
+        while low < high:
+            middle = (low + high) // 2
+            if self._ids[middle] < product_id:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _index(self, product_id: int, category_id, brand, variants) -> None:
+        bit = 1 << product_id
+        self._all |= bit
+        self._by_category[category_id] = self._by_category.get(category_id, 0) | bit
+        if brand:
+            self._by_brand[brand] = self._by_brand.get(brand, 0) | bit
+        for size, color, stock in variants:
+            if size and stock > 0:
+                # как apply_size_filter: размер считается только в наличии
+                self._by_size[size] = self._by_size.get(size, 0) | bit
+            if color:
+                self._by_color[color] = self._by_color.get(color, 0) | bit
+            if stock > 0:
+                self._in_stock |= bit
+        self._variants[product_id] = variants
+
+    # === Фильтрация ===
+    def filter(
+        self,
+        category_id: Optional[int] = None,
+        size: Optional[str] = None,
+        color: Optional[str] = None,
+        brand: Optional[str] = None,
+        in_stock: bool = False
+    ) -> int:
+        """Возвращает битовую карту товаров, подходящих под все фильтры.
+
+        Пустые фильтры не применяются, как в apply_category_filter и
+        apply_size_filter.
+        """
+        result = self._all
+        if category_id is not None:
+            result &= self._by_category.get(category_id, 0)
+        if size:
+            result &= self._by_size.get(size, 0)
+        if color:
+            result &= self._by_color.get(color, 0)
+        if brand:
+            result &= self._by_brand.get(brand, 0)
+        if in_stock:
+            result &= self._in_stock
+        return result
+
+    @staticmethod
+    def page_ids(
+        bitmap: int,
+        after_id: int = 0,
+        before_id: int = 0,
+        page_size: int = 10
+    ) -> tuple[list[int], bool]:
+        """Keyset-страница id из битовой карты, как в orm_get_filtered_products.
+
+        return: (id по возрастанию, есть ли ещё товары в направлении листания)
+        """
+        ids = []
+        if before_id:
+            bitmap &= (1 << before_id) - 1  # только id < before_id
+            while bitmap and len(ids) <= page_size:
+                product_id = bitmap.bit_length() - 1  # старший бит
+                ids.append(product_id)
+                bitmap ^= 1 << product_id
+            has_more = len(ids) > page_size
+            ids = ids[:page_size]
+            ids.reverse()
+            return ids, has_more
+
+        bitmap = (bitmap >> (after_id + 1)) << (after_id + 1)  # только id > after_id
+        while bitmap and len(ids) <= page_size:
+            lowest = bitmap & -bitmap  # младший бит
+            ids.append(lowest.bit_length() - 1)
+            bitmap ^= lowest
+        has_more = len(ids) > page_size
+        return ids[:page_size], has_more
+
+    def size_counts(self, category_id: Optional[int] = None) -> dict[str, int]:
+        """Количество товаров в наличии по размерам в категории
+        (как facets['sizes'] из orm_get_facet_counts)."""
+        products = self.filter(category_id=category_id) & self._in_stock
+        counts: dict[str, int] = {}
+        while products:
+            lowest = products & -products
+            product_id = lowest.bit_length() - 1
+            for size in {size for size, _, stock in self._variants[product_id] if size and stock > 0}:
+                counts[size] = counts.get(size, 0) + 1
+            products ^= lowest
+        return counts
+
+    async def get_filtered_products(
+        self,
+        session: AsyncSession,
+        category_id: Optional[int] = None,
+        size: Optional[str] = None,
+        after_id: int = 0,
+        before_id: int = 0,
+        page_size: int = 10
+    ) -> tuple[list[Product], bool]:
+        """Замена orm_get_filtered_products: id ищутся в индексах,
+        из БД загружается только сама страница товаров по первичному ключу."""
+        ids, has_more = self.page_ids(
+            self.filter(category_id=category_id, size=size), after_id, before_id, page_size
+        )
+        if not ids:
+            return [], has_more
+
+        result = await session.execute(get_base_product_query().where(Product.id.in_(ids)))
+        products = list(result.scalars().all())
+        for product in products:
+            for variant in product.variants:
+                set_committed_value(variant, 'product', product)
+        return products, has_more
+
+
+# Один движок на процесс бота, загружается при старте, если включён
+catalog_engine = CatalogEngine()
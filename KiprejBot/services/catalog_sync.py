@@ -0,0 +1,63 @@
+from typing import Optional
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from config import CATALOG_ENGINE_ENABLED
+from database.cache import catalog_cache
+from database.models import Product
+from services.catalog_engine import catalog_engine
+from services.search_index import search_index
+from services.reservations import STOCK_BOUNDARY_KEY
+
+
+# Все структуры каталога в памяти процесса (кэш запросов, битовые индексы,
+# индекс inline-поиска) обновляются отсюда, чтобы админские хэндлеры
+# не забывали ни одну из них.
+
+async def on_product_changed(session: AsyncSession, product_id: int, *category_ids: Optional[int]) -> None:
+    """Вызывается после добавления или изменения товара (и его вариантов).
+
+    category_ids: категории, в которых товар был до и после изменения.
+    """
+    catalog_cache.invalidate_products(*category_ids)
+    catalog_cache.invalidate('images', product_id)
+    await catalog_engine.refresh_product(session, product_id)
+    await search_index.refresh_product(session, product_id)
+
+
+async def on_stock_changed(session: AsyncSession) -> None:
+    """Вызывается после commit, изменившего остатки товаров: резерв при
+    добавлении в корзину, возврат резерва, оформление заказа.
+
+    Кэш трогается, только если вариант закончился или снова появился
+    (функции services.reservations отмечают такие товары в session.info):
+    тогда сбрасываются страницы товаров, размеры и фасеты их категорий,
+    закэшированные товары с фото и обновляется наличие в битовых индексах.
+    Обычное уменьшение остатка кэш каталога не сбрасывает, число "В наличии"
+    в закэшированных товарах обновится по истечении CATALOG_CACHE_TTL.
+    """
+    product_ids = session.info.pop(STOCK_BOUNDARY_KEY, set())
+    if not product_ids:
+        return
+    category_ids = set(await session.scalars(
+        select(Product.category_id).where(Product.id.in_(product_ids))
+    ))
+    if category_ids:
+        catalog_cache.invalidate_products(*category_ids)
+    for product_id in product_ids:
+        catalog_cache.invalidate('images', product_id)
+        await catalog_engine.refresh_product(session, product_id)
+
+
+def on_product_deleted(product_id: int, category_id: Optional[int]) -> None:
+    """Вызывается после удаления товара."""
+    catalog_cache.invalidate_products(category_id)
+    catalog_cache.invalidate('images', product_id)
+    catalog_engine.remove_product(product_id)
+    search_index.remove_product(product_id)
+
+
+async def reload_catalog_indexes(session: AsyncSession) -> None:
+    """Полностью перестраивает индексы каталога в памяти."""
+    if CATALOG_ENGINE_ENABLED:
+        await catalog_engine.load(session)
+    await search_index.load(session)
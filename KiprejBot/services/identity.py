@@ -0,0 +1,83 @@
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Optional
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, User as TelegramUser
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from config import IDENTITY_CACHE_TTL, IDENTITY_CACHE_MAXSIZE
+from database.cache import CatalogCache
+from database.models import User, Cart
+
+
+ADMIN_ROLES = {"admin", "superuser"}
+
+
+@dataclass(frozen=True)
+class Identity:
+    """Кто прислал обновление: id в БД, роль и корзина.
+    Для незарегистрированного пользователя user_id и cart_id — None."""
+    telegram_id: int
+    user_id: Optional[int] = None
+    role: str = "user"
+    cart_id: Optional[int] = None
+
+    @property
+    def is_registered(self) -> bool:
+        return self.user_id is not None
+
+    @property
+    def is_admin(self) -> bool:
+        return self.role in ADMIN_ROLES
+
+    @property
+    def is_superuser(self) -> bool:
+        return self.role == "superuser"
+
+
+# Ключ — ('identity', telegram_id). Записи сбрасываются при смене роли,
+# регистрации, удалении профиля и создании корзины; ttl — страховка
+identity_cache = CatalogCache(ttl=IDENTITY_CACHE_TTL, maxsize=IDENTITY_CACHE_MAXSIZE)
+
+
+async def get_identity(session: AsyncSession, telegram_id: int) -> Identity:
+    """Identity пользователя из кэша, при промахе — один запрос к БД."""
+    key = ('identity', telegram_id)
+    found, identity = identity_cache.get(key)
+    if found:
+        return identity
+
+    row = (await session.execute(
+        select(User.id, User.role, Cart.id)
+        .outerjoin(Cart, Cart.user_id == User.id)
+        .where(User.telegram_id == telegram_id)
+    )).first()
+    if row is None:
+        identity = Identity(telegram_id=telegram_id)
+    else:
+        user_id, role, cart_id = row
+        identity = Identity(telegram_id, user_id, role.value if role else "user", cart_id)
+    identity_cache.set(key, identity)
+    return identity
+
+
+def invalidate_identity(telegram_id: int) -> None:
+    """Сбрасывает закэшированную Identity пользователя."""
+    identity_cache.invalidate('identity', telegram_id)
+
+
+class IdentityMiddleware(BaseMiddleware):
+    """Кладёт в data['identity'] Identity отправителя обновления.
+
+    Подключается после DataBaseSession: при промахе кэша использует сессию
+    обновления. В установившемся режиме проверки ролей не делают запросов.
+    """
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        from_user: TelegramUser | None = data.get('event_from_user')
+        if from_user is not None:
+            data['identity'] = await get_identity(data['session'], from_user.id)
+        return await handler(event, data)
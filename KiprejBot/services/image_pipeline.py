@@ -0,0 +1,79 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Optional
+from PIL import Image, ImageOps
+
+
+# Размеры производных изображений (по большей стороне, пиксели)
+CARD_SIZE = 1280   # фото карточки товара: Telegram всё равно сжимает фото до 1280
+THUMBNAIL_SIZE = 320
+
+# Пул процессов для обработки фото: сжатие картинок нагружает процессор
+# и не должно блокировать цикл событий бота
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+def get_executor() -> ProcessPoolExecutor:
+    """Создаёт пул процессов при первой обработке фото."""
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=2)
+    return _executor
+
+
+def shutdown_executor() -> None:
+    """Останавливает пул процессов при завершении бота."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def get_derivative_paths(source_path: str | Path) -> dict[str, Path]:
+    """Пути производных фото: рядом с исходным файлом, с тем же именем."""
+    source = Path(source_path)
+    return {
+        'original': source.with_name(f'{source.stem}.jpg'),
+        'card': source.with_name(f'{source.stem}_card.jpg'),
+        'thumbnail': source.with_name(f'{source.stem}_thumb.jpg'),
+    }
+
+
+def build_derivatives(source_path: str) -> dict[str, str]:
+    """Строит производные фото товара (выполняется в отдельном процессе).
+
+    - original: исходное фото без EXIF (геометка, модель телефона и т.п.),
+      повёрнутое по EXIF-ориентации;
+    - card: фото для карточки товара, до CARD_SIZE пикселей;
+    - thumbnail: миниатюра до THUMBNAIL_SIZE пикселей для альбомов каталога.
+    WebP не строится: Telegram всё равно перекодирует фото в JPEG.
+    Исходный файл заменяется очищенным оригиналом.
+    return: {вид производного: путь к файлу}
+    """
+    source = Path(source_path)
+    paths = get_derivative_paths(source)
+
+    with Image.open(source) as image:
+        # Поворачиваем по EXIF, дальше метаданные не сохраняются
+        image = ImageOps.exif_transpose(image).convert('RGB')
+
+        card = image.copy()
+        card.thumbnail((CARD_SIZE, CARD_SIZE))
+        card.save(paths['card'], 'JPEG', quality=85, optimize=True, progressive=True)
+
+        thumbnail = image.copy()
+        thumbnail.thumbnail((THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+        thumbnail.save(paths['thumbnail'], 'JPEG', quality=80, optimize=True)
+
+        image.save(paths['original'], 'JPEG', quality=95)
+
+    if source != paths['original']:
+        source.unlink(missing_ok=True)
+    return {kind: str(path) for kind, path in paths.items()}
+
+
+async def process_product_image(source_path: str) -> dict[str, str]:
+    """Асинхронная обёртка над build_derivatives: работа идёт в пуле процессов."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(), build_derivatives, source_path)
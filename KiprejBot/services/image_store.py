@@ -0,0 +1,107 @@
+import asyncio
+import hashlib
+import os
+import time
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import AsyncIterator
+import aiofiles
+from config import UPLOAD_DIR
+from services.image_pipeline import get_derivative_paths, process_product_image
+from services.upload_gc import MIN_FILE_AGE
+
+
+# Папка для временных файлов, пока не посчитан хэш содержимого
+TMP_DIR = UPLOAD_DIR / 'tmp'
+
+# Блокировки по хэшу: одинаковые фото, пришедшие одновременно,
+# обрабатываются один раз. Рядом — сколько задач держат или ждут
+# блокировку: удалять её из словаря можно только когда их не осталось
+_locks: dict[str, asyncio.Lock] = {}
+_lock_users: dict[str, int] = {}
+
+
+@asynccontextmanager
+async def content_lock(content_hash: str) -> AsyncIterator[None]:
+    """Блокировка файлов одного хэша: запись в хранилище и удаление."""
+    lock = _locks.setdefault(content_hash, asyncio.Lock())
+    _lock_users[content_hash] = _lock_users.get(content_hash, 0) + 1
+    try:
+        async with lock:
+            yield
+    finally:
+        _lock_users[content_hash] -= 1
+        if not _lock_users[content_hash]:
+            del _lock_users[content_hash]
+            del _locks[content_hash]
+
+
+def get_content_path(content_hash: str, ext: str) -> Path:
+    """Путь файла в хранилище по хэшу содержимого.
+
+    Файлы раскладываются по двум уровням подпапок из первых символов хэша
+    (ab/cd/abcd....jpg), чтобы в одной папке не скапливались сотни тысяч
+    файлов.
+    """
+    return UPLOAD_DIR / content_hash[:2] / content_hash[2:4] / f'{content_hash}.{ext}'
+
+
+async def get_file_hash(path: Path, chunk_size: int = 1024 * 1024) -> str:
+    """SHA-256 содержимого файла, читаем кусками, не загружая файл целиком."""
+    digest = hashlib.sha256()
+    async with aiofiles.open(path, 'rb') as file:
+        while chunk := await file.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+async def store_image(tmp_path: Path, ext: str) -> tuple[str, dict[str, str]]:
+    """Переносит скачанное фото в хранилище по хэшу и строит производные.
+
+    Если такое же фото уже есть в хранилище, временный файл удаляется,
+    а возвращаются пути уже готовых файлов: повторная загрузка того же
+    фото не занимает место на диске. Время изменения этих файлов
+    обновляется: пока новая запись ProductImage не сохранена, на них нет
+    ссылок в БД, и remove_unused_content их не тронет (см. is_recently_stored).
+    return: (хэш содержимого, {вид производного: путь})
+    """
+    content_hash = await get_file_hash(tmp_path)
+    target = get_content_path(content_hash, ext)
+    existing = get_derivative_paths(target)
+
+    async with content_lock(content_hash):
+        if all(path.exists() for path in existing.values()):
+            tmp_path.unlink(missing_ok=True)
+            for path in existing.values():
+                os.utime(path)
+            derivatives = {kind: str(path) for kind, path in existing.items()}
+        else:
+            target.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(tmp_path, target)
+            # Сжатые копии и очищенный от EXIF оригинал строятся в пуле процессов
+            try:
+                derivatives = await process_product_image(str(target))
+            except Exception as e:
+                print(f"Ошибка обработки фото {target}: {e}")  # остаётся исходный файл
+                derivatives = {'original': str(target)}
+    return content_hash, derivatives
+
+
+def is_recently_stored(paths: list[str]) -> bool:
+    """Файлы записаны или повторно выданы store_image недавно (моложе
+    MIN_FILE_AGE): запись ProductImage для них могла ещё не сохраниться.
+    Такие файлы оставляем ночной очистке (services.upload_gc)."""
+    min_mtime = time.time() - MIN_FILE_AGE
+    for path in paths:
+        try:
+            if os.stat(path).st_mtime > min_mtime:
+                return True
+        except FileNotFoundError:
+            continue
+    return False
+
+
+def remove_image_files(paths: list[str]) -> None:
+    """Удаляет файлы фото из хранилища."""
+    for path in paths:
+        Path(path).unlink(missing_ok=True)
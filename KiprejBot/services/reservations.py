@@ -0,0 +1,171 @@
+from datetime import timedelta
+from typing import Iterable, Optional
+from sqlalchemy import select, update, delete, insert, func, literal, Integer
+from sqlalchemy.ext.asyncio import AsyncSession
+from config import RESERVATION_TTL_MINUTES
+from database.models import ProductVariant, StockReservation
+
+
+# Остаток на складе при резервах меняется только через функции этого
+# модуля: списание и возврат — каждый одним SQL-запросом, поэтому
+# параллельные покупатели не могут забрать больше, чем есть на складе.
+# Функции не делают commit: резерв сохраняется в транзакции вызывающего кода.
+
+RESERVATION_TTL = timedelta(minutes=RESERVATION_TTL_MINUTES)
+
+# Ключ в session.info: товары, у которых вариант закончился или снова
+# появился на складе. Только для них services.catalog_sync.on_stock_changed
+# сбрасывает страницы каталога, фасеты и битовые индексы
+STOCK_BOUNDARY_KEY = 'stock_boundary_products'
+
+
+def mark_stock_boundary(session: AsyncSession, product_ids: Iterable[int]) -> None:
+    """Запоминает товары, у которых вариант перешёл границу "в наличии"."""
+    session.info.setdefault(STOCK_BOUNDARY_KEY, set()).update(product_ids)
+
+
+class OutOfStockError(ValueError):
+    """На складе не хватает товара для резерва."""
+
+
+def check_quantity(quantity: int) -> None:
+    """Количество приходит из callback-данных, которые клиент может подделать:
+    отрицательное количество в stock - :q прибавило бы товар на склад."""
+    if quantity < 1:
+        raise ValueError(f'Некорректное количество товара: {quantity}.')
+
+
+async def take_stock(session: AsyncSession, variant_id: int, quantity: int) -> None:
+    """Списывает quantity единиц варианта со склада без резерва:
+    UPDATE ... SET stock = stock - :q WHERE id = :id AND stock >= :q.
+    OutOfStockError, если товара не хватает."""
+    check_quantity(quantity)
+    result = await session.execute(
+        update(ProductVariant)
+        .where(ProductVariant.id == variant_id, ProductVariant.stock >= quantity)
+        .values(stock=ProductVariant.stock - quantity)
+        .returning(ProductVariant.product_id, ProductVariant.stock)
+    )
+    taken = result.first()
+    if taken is None:
+        raise OutOfStockError(f'Недостаточно товара на складе (вариант {variant_id}).')
+    if taken.stock == 0:
+        mark_stock_boundary(session, [taken.product_id])
+
+
+async def reserve_stock(
+    session: AsyncSession,
+    variant_id: int,
+    quantity: int,
+    cart_id: Optional[int] = None
+) -> int:
+    """Списывает quantity единиц варианта со склада и создаёт резерв.
+
+    WITH taken AS (UPDATE product_variants SET stock = stock - :q
+                   WHERE id = :id AND stock >= :q RETURNING id, product_id, stock),
+         reserved AS (INSERT INTO stock_reservations (...) SELECT ... FROM taken
+                      RETURNING id)
+    SELECT reserved.id, taken.product_id, taken.stock FROM reserved, taken
+
+    Условие stock >= :q проверяется под блокировкой строки, поэтому даже
+    сотни одновременных запросов не уведут склад в минус.
+    return: id резерва; OutOfStockError, если товара не хватает.
+    """
+    check_quantity(quantity)
+    taken = (
+        update(ProductVariant)
+        .where(ProductVariant.id == variant_id, ProductVariant.stock >= quantity)
+        .values(stock=ProductVariant.stock - quantity)
+        .returning(ProductVariant.id, ProductVariant.product_id, ProductVariant.stock)
+        .cte('taken')
+    )
+    reserved = (
+        insert(StockReservation)
+        .from_select(
+            ['variant_id', 'cart_id', 'quantity', 'expires_at'],
+            select(
+                taken.c.id,
+                literal(cart_id, Integer),
+                literal(quantity),
+                func.now() + RESERVATION_TTL
+            )
+        )
+        .returning(StockReservation.id)
+        .cte('reserved')
+    )
+    query = select(reserved.c.id, taken.c.product_id, taken.c.stock)
+    row = (await session.execute(query)).first()
+    if row is None:
+        raise OutOfStockError(f'Недостаточно товара на складе (вариант {variant_id}).')
+    if row.stock == 0:
+        mark_stock_boundary(session, [row.product_id])
+    return row.id
+
+
+async def release_reservations(session: AsyncSession, *conditions) -> int:
+    """Удаляет резервы по условиям и возвращает их количество на склад.
+
+    WITH released AS (DELETE FROM stock_reservations WHERE ... RETURNING ...)
+    UPDATE product_variants SET stock = stock + сумма по варианту
+
+    return: сколько вариантов товара получили товар обратно
+    """
+    released = (
+        delete(StockReservation)
+        .where(*conditions)
+        .returning(StockReservation.variant_id, StockReservation.quantity)
+        .cte('released')
+    )
+    totals = (
+        select(released.c.variant_id, func.sum(released.c.quantity).label('quantity'))
+        .group_by(released.c.variant_id)
+        .subquery('totals')
+    )
+    query = (
+        update(ProductVariant)
+        .where(ProductVariant.id == totals.c.variant_id)
+        .values(stock=ProductVariant.stock + totals.c.quantity)
+        .returning(ProductVariant.product_id, ProductVariant.stock, totals.c.quantity)
+        .add_cte(released)
+    )
+    rows = (await session.execute(query)).all()
+    # остаток был нулевым — вариант снова в наличии
+    mark_stock_boundary(session, [row.product_id for row in rows if row.stock == row.quantity])
+    return len(rows)
+
+
+async def release_cart_reservations(
+    session: AsyncSession,
+    cart_id: int,
+    variant_id: Optional[int] = None
+) -> int:
+    """Снимает резервы корзины (или одного варианта в ней)."""
+    conditions = [StockReservation.cart_id == cart_id]
+    if variant_id is not None:
+        conditions.append(StockReservation.variant_id == variant_id)
+    return await release_reservations(session, *conditions)
+
+
+async def consume_cart_reservations(session: AsyncSession, cart_id: int) -> dict[int, int]:
+    """Оформление заказа: резервы корзины становятся окончательным списанием.
+
+    Резервы удаляются без возврата товара на склад (он уже списан при
+    добавлении в корзину).
+    return: {variant_id: сколько было в резерве}
+    """
+    result = await session.execute(
+        delete(StockReservation)
+        .where(StockReservation.cart_id == cart_id)
+        .returning(StockReservation.variant_id, StockReservation.quantity)
+    )
+    held: dict[int, int] = {}
+    for variant_id, quantity in result:
+        held[variant_id] = held.get(variant_id, 0) + quantity
+    return held
+
+
+async def expire_reservations(session: AsyncSession) -> int:
+    """Возвращает на склад все истёкшие резервы (запускается планировщиком)."""
+    released = await release_reservations(session, StockReservation.expires_at < func.now())
+    await session.commit()
+    return released
@@ -0,0 +1,84 @@
+"""Нагрузочная проверка резервов склада: нет ли перепродажи.
+
+Запуск из папки KiprejBot на тестовой базе:
+
+    python -m services.reservations_stress [покупателей] [остаток]
+
+Создаётся временный товар с одним вариантом и остатком (по умолчанию 50),
+затем покупатели (по умолчанию 300) одновременно, каждый в своей сессии,
+пытаются зарезервировать по одной штуке. Успешных резервов должно быть
+ровно столько, сколько было на складе, а остаток — ноль. После проверки
+временный товар удаляется.
+"""
+import asyncio
+import sys
+from sqlalchemy import select, delete, func
+from database.models import Product, ProductVariant, StockReservation
+from services.reservations import reserve_stock, OutOfStockError
+
+
+async def buy(session_pool, variant_id: int) -> bool:
+    """Один покупатель: резерв одной штуки в собственной транзакции."""
+    async with session_pool() as session:
+        try:
+            await reserve_stock(session, variant_id, 1)
+        except OutOfStockError:
+            await session.rollback()
+            return False
+        await session.commit()
+        return True
+
+
+async def run_stress(session_pool, buyers: int = 300, stock: int = 50) -> dict:
+    """Запускает buyers одновременных резервов на вариант с остатком stock."""
+    async with session_pool() as session:
+        product = Product(name='Проверка резервов', price=100)
+        product.variants.append(ProductVariant(size='STRESS', stock=stock))
+        session.add(product)
+        await session.commit()
+        product_id, variant_id = product.id, product.variants[0].id
+
+    try:
+        results = await asyncio.gather(*(buy(session_pool, variant_id) for _ in range(buyers)))
+
+        async with session_pool() as session:
+            left = await session.scalar(select(ProductVariant.stock).where(ProductVariant.id == variant_id))
+            reserved = await session.scalar(
+                select(func.coalesce(func.sum(StockReservation.quantity), 0))
+                .where(StockReservation.variant_id == variant_id)
+            )
+    finally:
+        async with session_pool() as session:
+            await session.execute(delete(StockReservation).where(StockReservation.variant_id == variant_id))
+            await session.execute(delete(ProductVariant).where(ProductVariant.id == variant_id))
+            await session.execute(delete(Product).where(Product.id == product_id))
+            await session.commit()
+
+    return {
+        'buyers': buyers,
+        'stock': stock,
+        'succeeded': sum(results),
+        'left': left,
+        'reserved': reserved,
+        'ok': sum(results) == stock and left == 0 and reserved == stock,
+    }
+
+
+async def main():
+    from database.db import async_session
+
+    buyers = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    stock = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    report = await run_stress(async_session, buyers, stock)
+
+    print(f"Покупателей: {report['buyers']}, на складе было: {report['stock']}")
+    print(f"Успешных резервов: {report['succeeded']}, зарезервировано: {report['reserved']}, "
+          f"осталось: {report['left']}")
+    if not report['ok']:
+        print('❌ Перепродажа или потеря резервов!')
+        raise SystemExit(1)
+    print('✅ Перепродажи нет.')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
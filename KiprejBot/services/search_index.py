@@ -0,0 +1,147 @@
+from dataclasses import dataclass
+from typing import Optional
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from database.models import Product
+
+
+@dataclass
+class IndexedProduct:
+    """Короткая запись о товаре для inline-подсказок."""
+    id: int
+    name: str
+    brand: Optional[str]
+    price: float
+    description: Optional[str]
+
+
+def normalize(text: str) -> str:
+    """Приводит текст к виду для поиска: нижний регистр, ё -> е."""
+    return (text or '').lower().replace('ё', 'е')
+
+
+def get_trigrams(word: str) -> set[str]:
+    """Триграммы слова с пробелами по краям, как в pg_trgm:
+    'кот' -> {'  к', ' ко', 'кот', 'от '}."""
+    padded = f'  {word} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class ProductSearchIndex:
+    """Индекс в памяти для inline-поиска @KiprejBot <запрос>.
+
+    Inline-запросы приходят на каждое нажатие клавиши, поэтому они не
+    ходят в PostgreSQL. Для коротких слов (1-2 буквы) используется индекс
+    префиксов слов, для более длинных — триграммы, которые прощают опечатки
+    и окончания ('курткa' ~ 'куртки'). Индексируются название и бренд.
+    """
+
+    # Доля совпавших триграмм слова, при которой товар считается найденным
+    MIN_SIMILARITY = 0.5
+
+    def __init__(self):
+        self.ready = False
+        self._products: dict[int, IndexedProduct] = {}
+        self._prefixes: dict[str, set[int]] = {}
+        self._trigrams: dict[str, set[int]] = {}
+
+    async def load(self, session: AsyncSession) -> None:
+        """Полностью перестраивает индекс по данным из БД."""
+        result = await session.execute(
+            select(Product.id, Product.name, Product.brand, Product.price, Product.description)
+        )
+        self._products = {}
+        self._prefixes = {}
+        self._trigrams = {}
+        for row in result.all():
+            self._add(IndexedProduct(*row))
+        self.ready = True
+
+    async def refresh_product(self, session: AsyncSession, product_id: int) -> None:
+        """Перечитывает из БД один товар после его изменения админом."""
+        if not self.ready:
+            return
+        self.remove_product(product_id)
+        row = (await session.execute(
+            select(Product.id, Product.name, Product.brand, Product.price, Product.description)
+            .where(Product.id == product_id)
+        )).first()
+        if row is not None:
+            self._add(IndexedProduct(*row))
+
+    def remove_product(self, product_id: int) -> None:
+        """Убирает товар из индекса."""
+        product = self._products.pop(product_id, None)
+        if product is None:
+            return
+        for word in self._words(product):
+            for index, keys in ((self._prefixes, self._word_prefixes(word)),
+                                (self._trigrams, get_trigrams(word))):
+                for key in keys:
+                    ids = index.get(key)
+                    if ids is not None:
+                        ids.discard(product_id)
+                        if not ids:
+                            del index[key]
+
+    def _add(self, product: IndexedProduct) -> None:
+        self._products[product.id] = product
+        for word in self._words(product):
+            for prefix in self._word_prefixes(word):
+                self._prefixes.setdefault(prefix, set()).add(product.id)
+            for trigram in get_trigrams(word):
+                self._trigrams.setdefault(trigram, set()).add(product.id)
+
+    @staticmethod
+    def _words(product: IndexedProduct) -> set[str]:
+        return set(normalize(f'{product.name} {product.brand or ""}').split())
+
+    @staticmethod
+    def _word_prefixes(word: str) -> list[str]:
+        return [word[:length] for length in range(1, min(len(word), 2) + 1)]
+
+    def search(self, query: str, limit: int = 20, offset: int = 0) -> list[IndexedProduct]:
+        """Товары, подходящие под все слова запроса, лучшие совпадения первыми."""
+        words = normalize(query).split()
+        if not words:
+            return []
+
+        scores: Optional[dict[int, float]] = None
+        for word in words:
+            word_scores = self._match_word(word)
+            if scores is None:
+                scores = word_scores
+            else:
+                # Товар должен подходить под каждое слово запроса
+                scores = {
+                    product_id: score + word_scores[product_id]
+                    for product_id, score in scores.items() if product_id in word_scores
+                }
+            if not scores:
+                return []
+
+        ranked = sorted(scores, key=lambda product_id: (-scores[product_id], product_id))
+        return [self._products[product_id] for product_id in ranked[offset:offset + limit]]
+
+    def _match_word(self, word: str) -> dict[int, float]:
+        """Оценка совпадения одного слова запроса для каждого товара (0..1)."""
+        if len(word) < 3:
+            return {product_id: 1.0 for product_id in self._prefixes.get(word, ())}
+
+        # Слово запроса может быть недопечатано, поэтому не учитываем
+        # последнюю триграмму с пробелом в конце
+        trigrams = get_trigrams(word) - {f'{word[-2:]} '}
+        hits: dict[int, int] = {}
+        for trigram in trigrams:
+            for product_id in self._trigrams.get(trigram, ()):
+                hits[product_id] = hits.get(product_id, 0) + 1
+
+        return {
+            product_id: count / len(trigrams)
+            for product_id, count in hits.items()
+            if count / len(trigrams) >= self.MIN_SIMILARITY
+        }
+
+
+# Один индекс на процесс бота
+search_index = ProductSearchIndex()
@@ -0,0 +1,168 @@
+import asyncio
+import os
+import re
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterator
+from sqlalchemy import select, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from config import UPLOAD_DIR, UPLOAD_GC_MODE
+from database.models import ProductImage
+
+
+# Куда переносятся ненужные файлы в режиме карантина (вне UPLOAD_DIR,
+# чтобы не попадать в следующий обход)
+QUARANTINE_DIR = UPLOAD_DIR.parent / 'quarantine'
+
+# Файлы моложе этого возраста (сек.) не трогаем: фото могло быть только что
+# скачано, а запись ProductImage ещё не сохранена
+MIN_FILE_AGE = 6 * 60 * 60
+
+# Сколько путей к файлам в отчёте показывать примером
+REPORT_SAMPLE_SIZE = 20
+
+# Имена файлов хранилища по хэшу: <sha256>.jpg, <sha256>_thumb.jpg и т.п.
+CONTENT_NAME = re.compile(r'^([0-9a-f]{64})(?:_[a-z]+)?\.\w+$')
+
+# Колонки ProductImage, в которых хранятся пути к файлам
+PATH_COLUMNS = (ProductImage.image_url, ProductImage.card_path, ProductImage.thumbnail_path)
+
+
+@dataclass
+class UploadsReport:
+    """Итог обхода папки с фото. Хранит только счётчики и несколько
+    примеров путей, а не весь список файлов."""
+    dry_run: bool
+    scanned: int = 0
+    orphaned: int = 0
+    orphaned_bytes: int = 0
+    removed: int = 0
+    sample: list[str] = field(default_factory=list)
+
+    def format(self) -> str:
+        action = 'будет удалено' if self.dry_run else (
+            'перенесено в карантин' if UPLOAD_GC_MODE == 'quarantine' else 'удалено'
+        )
+        lines = [
+            f"{'🔎 Пробный запуск' if self.dry_run else '🧹 Очистка'} папки с фото товаров",
+            f"Просмотрено файлов: {self.scanned}",
+            f"Без ссылок из БД: {self.orphaned} ({self.orphaned_bytes / 1024 / 1024:.1f} МБ)",
+            f"Файлов {action}: {self.orphaned if self.dry_run else self.removed}",
+        ]
+        if self.sample:
+            lines.append("\nНапример:")
+            lines.extend(self.sample)
+        return "\n".join(lines)
+
+
+def iter_upload_chunks(root: Path, chunk_size: int) -> Iterator[list[os.DirEntry]]:
+    """Обходит дерево папок через os.scandir и отдаёт файлы порциями по
+    chunk_size. В памяти только текущая порция и стек ещё не пройденных папок.
+    """
+    chunk = []
+    directories = [str(root)]
+    while directories:
+        try:
+            with os.scandir(directories.pop()) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        directories.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        chunk.append(entry)
+                        if len(chunk) >= chunk_size:
+                            yield chunk
+                            chunk = []
+        except FileNotFoundError:
+            continue  # папку удалили во время обхода
+    if chunk:
+        yield chunk
+
+
+async def get_referenced_paths(session: AsyncSession, entries: list[os.DirEntry]) -> set[str]:
+    """Какие файлы из порции ещё нужны записям ProductImage.
+
+    Файлы хранилища по хэшу проверяются по индексу content_hash, старые
+    файлы с произвольными именами — по путям в колонках ProductImage.
+    """
+    referenced = set()
+    by_hash: dict[str, list[str]] = {}
+    legacy_paths = []
+    for entry in entries:
+        match = CONTENT_NAME.match(entry.name)
+        if match:
+            by_hash.setdefault(match.group(1), []).append(entry.path)
+        else:
+            legacy_paths.append(entry.path)
+
+    if by_hash:
+        result = await session.execute(
+            select(ProductImage.content_hash).distinct()
+            .where(ProductImage.content_hash.in_(list(by_hash)))
+        )
+        for content_hash in result.scalars():
+            referenced.update(by_hash[content_hash])
+
+    if legacy_paths:
+        result = await session.execute(
+            select(*PATH_COLUMNS).where(or_(*(column.in_(legacy_paths) for column in PATH_COLUMNS)))
+        )
+        for row in result:
+            referenced.update(path for path in row if path)
+    return referenced
+
+
+def dispose_file(entry: os.DirEntry) -> None:
+    """Удаляет файл или переносит его в карантин (UPLOAD_GC_MODE)."""
+    if UPLOAD_GC_MODE == 'quarantine':
+        target = QUARANTINE_DIR / os.path.relpath(entry.path, UPLOAD_DIR)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(entry.path, target)
+    else:
+        os.remove(entry.path)
+
+
+async def collect_orphaned_uploads(
+    session: AsyncSession,
+    dry_run: bool = True,
+    chunk_size: int = 500
+) -> UploadsReport:
+    """Ищет в UPLOAD_DIR файлы, на которые не ссылается ни одна запись
+    ProductImage, и удаляет их (или переносит в карантин).
+
+    Папка и таблица проверяются порциями по chunk_size файлов: на каждую
+    порцию один-два запроса к БД, полный список файлов в память не грузится.
+    При dry_run ничего не удаляется, только считается отчёт.
+    """
+    report = UploadsReport(dry_run=dry_run)
+    min_mtime = time.time() - MIN_FILE_AGE
+
+    for entries in iter_upload_chunks(UPLOAD_DIR, chunk_size):
+        report.scanned += len(entries)
+        referenced = await get_referenced_paths(session, entries)
+
+        for entry in entries:
+            if entry.path in referenced:
+                continue
+            try:
+                stat = entry.stat(follow_symlinks=False)
+            except FileNotFoundError:
+                continue
+            if stat.st_mtime > min_mtime:
+                continue  # свежий файл, возможно, ещё сохраняется
+
+            report.orphaned += 1
+            report.orphaned_bytes += stat.st_size
+            if len(report.sample) < REPORT_SAMPLE_SIZE:
+                report.sample.append(entry.path)
+            if not dry_run:
+                try:
+                    dispose_file(entry)
+                    report.removed += 1
+                except OSError as e:
+                    print(f"Не удалось удалить {entry.path}: {e}")
+
+        # Отдаём управление циклу событий между порциями
+        await asyncio.sleep(0)
+
+    return report
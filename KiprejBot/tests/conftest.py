@@ -0,0 +1,9 @@
+import os
+import sys
+from pathlib import Path
+
+# Модули бота импортируются от корня KiprejBot (from config import ...)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# config.py требует id суперпользователя при импорте
+os.environ.setdefault("ALLOWED_SUPERUSER_ID", "0")
@@ -0,0 +1,104 @@
+"""Обновление админа проходит DataBaseSession и IdentityMiddleware,
+держа не больше одного соединения с БД (DB_CONNECTION_GUARD="strict")."""
+import asyncio
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip("aiosqlite")  # БД-заглушка: файл SQLite во временной папке
+
+from aiogram.types import Chat, Message, User as TelegramUser
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from database import db_middleware
+from database.db_middleware import (ConnectionLimitExceeded, DataBaseSession,
+                                    SessionUsageStats, install_connection_guard)
+from database.models import Cart, RoleEnum, User
+from services.identity import IdentityMiddleware, identity_cache
+from utils.role_decorator import admin_required
+
+
+ADMIN_TELEGRAM_ID = 1001
+
+
+async def create_session_pool(tmp_path) -> async_sessionmaker:
+    """Движок на SQLite со строгой проверкой соединений и админ в таблице users."""
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'bot.db'}")
+    install_connection_guard(engine)
+    async with engine.begin() as conn:
+        await conn.run_sync(User.metadata.create_all, tables=[User.__table__, Cart.__table__])
+    session_pool = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+    async with session_pool() as session:
+        session.add(User(telegram_id=ADMIN_TELEGRAM_ID, full_name="Admin", role=RoleEnum.ADMIN))
+        await session.commit()
+    return session_pool
+
+
+async def send_admin_update(session_pool: async_sessionmaker, handler):
+    """Одно сообщение админа через DataBaseSession -> IdentityMiddleware -> handler,
+    как его прогоняет диспетчер aiogram."""
+    user = TelegramUser(id=ADMIN_TELEGRAM_ID, is_bot=False, first_name="Admin")
+    message = Message(
+        message_id=1, date=datetime.now(), text="/admin",
+        chat=Chat(id=ADMIN_TELEGRAM_ID, type="private"), from_user=user
+    )
+
+    async def call_handler(event, data):
+        return await handler(event, **data)
+
+    async def with_identity(event, data):
+        return await IdentityMiddleware()(call_handler, event, data)
+
+    # задача — как у обновления в диспетчере: guard считает соединения по задаче
+    return await asyncio.create_task(
+        DataBaseSession(session_pool)(with_identity, message, {"event_from_user": user})
+    )
+
+
+@pytest.fixture
+def strict_guard(monkeypatch) -> SessionUsageStats:
+    monkeypatch.setattr(db_middleware, "DB_CONNECTION_GUARD", "strict")
+    stats = SessionUsageStats()
+    monkeypatch.setattr(db_middleware, "session_usage", stats)
+    identity_cache.clear()
+    return stats
+
+
+def test_admin_update_uses_one_connection(tmp_path, strict_guard):
+    @admin_required
+    async def admin_handler(message, session):
+        return (await session.execute(select(User.id))).scalars().all()
+
+    async def scenario():
+        session_pool = await create_session_pool(tmp_path)
+        try:
+            return await send_admin_update(session_pool, admin_handler)
+        finally:
+            await session_pool.kw["bind"].dispose()
+
+    assert asyncio.run(scenario())  # хэндлер админа выполнился
+    assert strict_guard.updates == 1
+    assert strict_guard.checkouts >= 1
+    assert strict_guard.overlapping == 0  # пик соединений за обновление <= 1
+
+
+def test_second_connection_in_update_is_rejected(tmp_path, strict_guard):
+    @admin_required
+    async def admin_handler(message, session):
+        await session.execute(select(User.id))
+        async with session_pool() as own_session:  # своя сессия мимо middleware
+            await own_session.execute(select(User.id))
+
+    async def scenario():
+        nonlocal session_pool
+        session_pool = await create_session_pool(tmp_path)
+        try:
+            await send_admin_update(session_pool, admin_handler)
+        finally:
+            await session_pool.kw["bind"].dispose()
+
+    session_pool = None
+    with pytest.raises(ConnectionLimitExceeded):
+        asyncio.run(scenario())
+    assert strict_guard.overlapping == 1
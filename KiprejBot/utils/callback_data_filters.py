@@ -1,28 +1,92 @@
+import zlib
+from typing import Optional
 from aiogram.filters.callback_data import CallbackData
 
 
+# Размеры длиннее этого (в байтах UTF-8) или с ':' в callback_data
+# кладутся не текстом, а коротким кодом "~<crc32>"
+SIZE_MAX_BYTES = 12
+SIZE_CODE_PREFIX = '~'
+
+# Код размера -> размер, для размеров, которые этот процесс уже упаковал
+_size_codes: dict[str, str] = {}
+
+
+def encode_size(size: str) -> str:
+    """Размер для callback_data: как есть или коротким кодом."""
+    if (len(size.encode()) <= SIZE_MAX_BYTES and ':' not in size
+            and not size.startswith(SIZE_CODE_PREFIX)):
+        return size
+    code = f'{SIZE_CODE_PREFIX}{zlib.crc32(size.encode()):08x}'
+    _size_codes[code] = size
+    return code
+
+
+def decode_size(value: str) -> str:
+    """Обратно к размеру. Незнакомый код (кнопка из сообщения до
+    перезапуска бота) превращается в "все размеры"."""
+    if value.startswith(SIZE_CODE_PREFIX):
+        return _size_codes.get(value, '')
+    return value
+
+
+class EncodedSizeMixin:
+    """Поле size упаковывается через encode_size и распаковывается обратно,
+    в обработчиках и клавиатурах размер всегда обычной строкой."""
+
+    def pack(self) -> str:
+        return CallbackData.pack(self.model_copy(update={'size': encode_size(self.size)}))
+
+    @classmethod
+    def unpack(cls, value: str):
+        callback_data = super().unpack(value)
+        return callback_data.model_copy(update={'size': decode_size(callback_data.size)})
+
+
 # создали фабрику callback_data
-class CategoryCallbackFactory(CallbackData, prefix='catalog'):
+class CategoryCallbackFactory(EncodedSizeMixin, CallbackData, prefix='catalog'):
     """Автоматически собирает callback_data по шаблону:
 
     "catalog" — префикс, просто чтобы отделять кнопки каталога от чужих
-    "action" — что нужно сделать (например, size, show)
+    "action" — что нужно сделать (например, size, show, card — товар
+               в режиме карусели)
     "category_id" — id категории (может быть None для "все товары")
     "size" — выбранный размер (или "all")
-    "page" - номер страницы
+    "page" - номер страницы (в карусели — номер товара), только для
+             отображения пользователю
+    "after_id" - id последнего показанного товара, следующая страница
+                 начинается с товаров, у которых id больше (0 — с начала)
+    "before_id" - id первого показанного товара, при листании назад
+                  берём товары, у которых id меньше (0 — не используется)
+    "sort" - порядок товаров: '' — по id (новизне), 'p' — по цене
+    "price" - номер ценового диапазона из PRICE_BUCKETS (-1 — любая цена)
+
+    Пример: catalog:show:3:M:2:57:0:p:-1
+    (action='show', category_id=3, size='M', page=2, after_id=57,
+     before_id=0, sort='p', price=-1)
 
-    Пример: catalog:show:3:all:2
-    (action='show', category_id=3, size='all', page=2)
+    Вместо номера страницы (OFFSET) храним курсор — id товара, поэтому
+    любая страница достаётся из БД одинаково быстро и не "съезжает",
+    если админ добавил товар, пока пользователь листает каталог.
+    Telegram ограничивает callback_data 64 байтами: заполнен только
+    один из курсоров, а размер длиннее SIZE_MAX_BYTES байт (кириллица —
+    2 байта на букву) или с ':' упаковывается в код из 9 символов
+    (encode_size), поэтому при id до 10 цифр строка укладывается в лимит.
+    В обработчики size приходит уже раскодированным.
     """
 
     action: str
-    category_id: int
+    category_id: Optional[int] = None
     size: str
     page: int = 1
+    after_id: int = 0
+    before_id: int = 0
+    sort: str = ''
+    price: int = -1
 
 
 # Фабрика для всех действий, связанных с карточкой товара
-class ProductCardCallbackFactory(CallbackData, prefix='product'):
+class ProductCardCallbackFactory(EncodedSizeMixin, CallbackData, prefix='product'):
     """Собирает callback_data по шаблону для карточки товара.
 
     'product' - префикс
@@ -30,6 +94,7 @@ class ProductCardCallbackFactory(CallbackData, prefix='product'):
                так мы можем понять, какое действие нужно выполнить в
                обработчике:
         photo: Листание фотографии товара
+        open: Открыть карточку товара (из альбома страницы каталога)
         size: Выбор размера товара
         quantity: Изменение количества товара
         add: Добавление товара в корзину
@@ -39,12 +104,31 @@ class ProductCardCallbackFactory(CallbackData, prefix='product'):
                     с помощью этого поля можно управлять перелистыванием
                     фото
     'size' - передаёт размер товара, если пользователь его выбрал, если
-             нет, оно будет пустым ("")
+             нет, оно будет пустым (""); длинный размер — кодом (encode_size)
     'quantity' - это количество товара, которое пользователь хочет
                  заказать, значение по умолчанию == 1
+    'variant_id' - id выбранного варианта, по нему вариант достаётся из БД
+                   по первичному ключу (0 — вариант ещё не выбран)
+    'version' - версия варианта в момент выбора размера, по ней видно,
+                что цена изменилась, пока пользователь выбирал количество
     """
-    action: str  # photo, size, quantity, add
+    action: str  # photo, open, size, quantity, add
     product_id: int
     image_index: int = 0  # для листания фото
     size: str = ''
     quantity: int = 1
+    variant_id: int = 0
+    version: int = 0
+
+
+# Фабрика для листания результатов поиска
+class SearchCallbackFactory(CallbackData, prefix='search'):
+    """Собирает callback_data для пагинации результатов поиска.
+
+    'search' - префикс
+    'page' - номер страницы результатов
+
+    Сам текст запроса не помещается в 64 байта callback_data,
+    поэтому он хранится в FSM (state data) пользователя.
+    """
+    page: int = 1
@@ -1,4 +1,14 @@
+from aiogram.types import InlineKeyboardMarkup
 from database.models import Product, ProductVariant
+from database.cache import CatalogCache
+from keyboards.product_card_keyboards import get_product_card_keyboard
+
+
+# Готовые подписи и кнопки карточек товаров. В ключ входят версии товара
+# и варианта и остаток на складе: после правки админом или изменения
+# остатка старая запись просто больше не запрашивается, поэтому срок жизни
+# не нужен — только предел размера
+card_cache = CatalogCache(ttl=float('inf'), maxsize=2048)
 
 
 def format_product_card_text(
@@ -8,13 +18,17 @@ def format_product_card_text(
         total_images: int) -> str:
     """Форматирует текст для карточки товара в HTML-разметке."""
 
-    # Рассчитываем цену с наценкой и скидкой для варианта
-    price_text = f"{variant.get_final_price()} ₽"  # итоговая цена с наценкой и скидкой
+    if variant:
+        # Рассчитываем цену с наценкой и скидкой для варианта
+        price_text = f"{variant.get_final_price()} ₽"  # итоговая цена с наценкой и скидкой
 
-    # Если есть старая цена (до скидки), добавляем её в текст
-    old_price = variant.old_price()
-    if old_price:
-        price_text += f" <s>{old_price} ₽</s>"
+        # Если есть старая цена (до скидки), добавляем её в текст
+        old_price = variant.old_price()
+        if old_price:
+            price_text += f" <s>{old_price} ₽</s>"
+    else:
+        # Размер не выбран — показываем базовую цену товара
+        price_text = f"от {product.price} ₽"
 
     # Формируем текст для карточки товара
     text = f"""
@@ -31,6 +45,45 @@ def format_product_card_text(
 """
     return text
 
+def get_card_cache_key(product: Product, variant: ProductVariant | None, *extra) -> tuple:
+    """Ключ кэша карточки: (товар, вариант, их версии, остаток, ...доп. параметры).
+    Остаток входит отдельно: резервы и заказы меняют его без смены версии."""
+    return (
+        'card', product.id, variant.id if variant else 0,
+        product.version, variant.version if variant else 0,
+        variant.stock if variant else 0, *extra
+    )
+
+
+def render_product_card_text(
+        product: Product,
+        variant: ProductVariant | None,
+        image_index: int,
+        total_images: int) -> str:
+    """format_product_card_text через кэш готовых подписей."""
+    key = get_card_cache_key(product, variant, 'text', image_index, total_images)
+    found, text = card_cache.get(key)
+    if not found:
+        text = format_product_card_text(product, variant, image_index, total_images)
+        card_cache.set(key, text)
+    return text
+
+
+def render_product_card(
+        product: Product,
+        variant: ProductVariant | None,
+        total_images: int) -> tuple[str, InlineKeyboardMarkup]:
+    """Подпись и кнопки карточки товара в каталоге (первое фото), из кэша."""
+    key = get_card_cache_key(product, variant, 'card', total_images)
+    found, payload = card_cache.get(key)
+    if not found:
+        payload = (
+            format_product_card_text(product, variant, image_index=0, total_images=total_images),
+            get_product_card_keyboard(product.id, total_images=total_images)
+        )
+        card_cache.set(key, payload)
+    return payload
+
 # <b> — жирный текст (для важных данных)
 # <s> — зачёркнутый текст (для старой цены)
 # <i> — курсив (например, "Без описания")
@@ -0,0 +1,57 @@
+from aiogram.types import FSInputFile, Message
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.attributes import set_committed_value
+from database.models import ProductImage
+from database.orm_requests import orm_set_image_file_ids
+
+
+def get_photo_input(image: ProductImage, thumbnail: bool = False) -> str | FSInputFile:
+    """Что передать в answer_photo / InputMediaPhoto для фото товара.
+
+    Если Telegram уже знает это фото, отправляем по file_id — без загрузки
+    файла. Иначе один раз загружаем с диска самый лёгкий подходящий файл:
+    сжатую копию для карточки, а если её нет — оригинал.
+    thumbnail=True — для альбомов каталога: миниатюра со своим file_id.
+    """
+    if thumbnail:
+        return image.thumbnail_file_id or FSInputFile(
+            image.thumbnail_path or image.card_path or image.image_url
+        )
+    return image.file_id or FSInputFile(image.card_path or image.image_url)
+
+
+async def remember_file_ids(
+    session: AsyncSession | None,
+    sent_photos: list[tuple[ProductImage, Message | bool]],
+    thumbnail: bool = False
+) -> None:
+    """Сохраняет file_id, которые Telegram вернул после загрузки фото с диска,
+    чтобы следующие показы шли уже по file_id. Вызывается один раз после
+    отправки: все новые file_id пишутся одним запросом.
+
+    sent_photos: [(фото товара, сообщение с этим фото)]
+    """
+    if session is None:
+        return
+    column = 'thumbnail_file_id' if thumbnail else 'file_id'
+    file_ids = {}
+    for image, sent in sent_photos:
+        if getattr(image, column) or not isinstance(sent, Message) or not sent.photo:
+            continue
+        file_ids[image.id] = sent.photo[-1].file_id  # самый большой размер фото
+    await orm_set_image_file_ids(session, file_ids, thumbnail)
+    # Объекты могли прийти из кэша каталога: обновляем значения без отметки
+    # об изменении, в БД они уже записаны
+    for image, _ in sent_photos:
+        if image.id in file_ids:
+            set_committed_value(image, column, file_ids[image.id])
+
+
+async def remember_file_id(
+    session: AsyncSession | None,
+    image: ProductImage,
+    sent: Message | bool,
+    thumbnail: bool = False
+) -> None:
+    """remember_file_ids для одного отправленного фото."""
+    await remember_file_ids(session, [(image, sent)], thumbnail)
@@ -1,12 +1,36 @@
 import functools
+import inspect
 from aiogram import types
-from database.db import async_session
-from database.orm_requests import orm_get_user_by_telegram, orm_get_user_role
+from services.identity import Identity
 
-# Задаем разрешенные роли для административных команд
-ALLOWED_ADMIN_ROLES = {"admin", "superuser"}
 
-ALLOWED_SUPERUSER_ROLE = "superuser"
+def role_required(check, denied_text: str):
+    """
+    Общая часть admin_required и superuser_required.
+
+    Роль берётся из data['identity'], которую кладёт IdentityMiddleware,
+    поэтому хэндлеру не нужно принимать ни session, ни identity.
+    aiogram передаёт хэндлеру только те данные, что есть в его сигнатуре,
+    поэтому обёртка принимает **data сама и отдаёт хэндлеру нужное.
+    """
+    def decorator(handler):
+        parameters = inspect.signature(handler).parameters
+        accepts_any = any(p.kind is inspect.Parameter.VAR_KEYWORD for p in parameters.values())
+
+        @functools.wraps(handler)
+        async def wrapper(message: types.Message, **data):
+            identity: Identity = data['identity']
+            if not check(identity):
+                await message.answer(denied_text)
+                return
+            if not accepts_any:
+                data = {name: value for name, value in data.items() if name in parameters}
+            return await handler(message, **data)
+
+        # aiogram смотрит сигнатуру через __wrapped__: без него он увидит **data обёртки
+        del wrapper.__wrapped__
+        return wrapper
+    return decorator
 
 
 def admin_required(handler):
@@ -14,16 +38,10 @@ def admin_required(handler):
     Декоратор для проверки, что у пользователя роль admin или superuser.
     Если роль не соответствует, отправляет сообщение об отсутствии доступа.
     """
-    @functools.wraps(handler)
-    async def wrapper(message: types.Message, *args, **kwargs):
-        telegram_id = message.from_user.id
-        async with async_session() as session:
-            user = await orm_get_user_by_telegram(session, telegram_id)
-        if not user or user.role not in ALLOWED_ADMIN_ROLES:
-            await message.answer("Доступ запрещён. Эта команда доступна только администраторам.")
-            return
-        return await handler(message, *args, **kwargs)
-    return wrapper
+    return role_required(
+        lambda identity: identity.is_admin,
+        "Доступ запрещён. Эта команда доступна только администраторам."
+    )(handler)
 
 
 def superuser_required(handler):
@@ -31,13 +49,7 @@ def superuser_required(handler):
     Декоратор для проверки, что у пользователя роль superuser.
     Если роль не соответствует, отправляет сообщение об отсутствии доступа.
     """
-    @functools.wraps(handler)
-    async def wrapper(message: types.Message, *args, **kwargs):
-        telegram_id = message.from_user.id
-        async with async_session() as session:
-            user = await orm_get_user_by_telegram(session, telegram_id)
-        if not user or user.role != ALLOWED_SUPERUSER_ROLE:
-            await message.answer("Доступ запрещён. Эта команда доступна только суперпользователю.")
-            return
-        return await handler(message, *args, **kwargs)
-    return wrapper
+    return role_required(
+        lambda identity: identity.is_superuser,
+        "Доступ запрещён. Эта команда доступна только суперпользователю."
+    )(handler)
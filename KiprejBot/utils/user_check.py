@@ -1,7 +1,7 @@
 from sqlalchemy.ext.asyncio import AsyncSession
 from database.models import User
 from sqlalchemy.future import select
-from database.orm_requests import orm_get_user_role
+from services.identity import get_identity
 
 async def user_check(session: AsyncSession, telegram_id: int) -> User | None:
     """
@@ -19,18 +19,15 @@ async def is_registered(session: AsyncSession, telegram_id: int) -> bool:
     """
     Проверяет, зарегистрирован ли пользователь в БД.
     Возвращает True, если пользователь зарегистрирован, иначе False.
+    Ответ берётся из кэша Identity.
     """
-    query = select(User).where(User.telegram_id == telegram_id)
-    result = await session.scalar(query)
-
-    print(f"🔍 Проверка регистрации: user_id={telegram_id}, найден={bool(result)}")  # Отладка
-
-    return result is not None
+    identity = await get_identity(session, telegram_id)
+    return identity.is_registered
 
 
 
 async def is_admin(session: AsyncSession, user_id: int) -> bool:
-    """Возвращает True, если пользователь администратор или суперюзер, иначе False."""
-    role = await orm_get_user_role(session, user_id)
-    print(f"🔍 Проверка админа: user_id={user_id}, role={role}")  # Отладочный вывод
-    return role in ["admin", "superuser"]
+    """Возвращает True, если пользователь администратор или суперюзер, иначе False.
+    Роль берётся из кэша Identity."""
+    identity = await get_identity(session, user_id)
+    return identity.is_admin